@@ -0,0 +1,71 @@
+"""
+data_source.py の dict リテラルを直接 import する場合と、data.py 経由で遅延読み込みする場合の起動コストを比較するベンチマーク
+
+それぞれのケースを新しいプロセスで繰り返し実行し、import にかかった時間と最大常駐メモリ (RSS) の中央値を出力する。
+
+$ python benchmark_data_import.py
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+current_dir = Path(__file__).parent
+
+# 各ケースで計測対象となるコード
+CASES = {
+    "literal (import data_source)": "from data_source import KATAKANA_MAP; len(KATAKANA_MAP)",
+    "lazy (import data, no access)": "import data",
+    "lazy (from data import KATAKANA_MAP)": "from data import KATAKANA_MAP; len(KATAKANA_MAP)",
+}
+
+# 子プロセス内で import 時間と最大 RSS を計測して JSON で返すためのコード
+MEASURE_CODE = """
+import json, resource, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+"""
+
+REPEAT = 10
+
+
+def measure(code: str) -> dict:
+    # 公平に比較するため、data_source.py の .pyc キャッシュも書き出せるようにしておく
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONDONTWRITEBYTECODE"}
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE_CODE.format(code=code)],
+        cwd=current_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def main() -> None:
+    # .pyc と marshal キャッシュを事前に作成しておき、2 回目以降の起動コストのみを比較する
+    for code in CASES.values():
+        measure(code)
+
+    baseline_process = [measure("pass") for _ in range(REPEAT)]
+    baseline_rss = statistics.median(r["maxrss_kb"] for r in baseline_process)
+    print(f"Empty interpreter: {baseline_rss / 1024:.1f} MB max RSS")
+
+    for name, code in CASES.items():
+        results = [measure(code) for _ in range(REPEAT)]
+        elapsed = statistics.median(r["elapsed"] for r in results)
+        rss = statistics.median(r["maxrss_kb"] for r in results)
+        print(
+            f"{name:40s} {elapsed * 1000:8.2f} ms  {rss / 1024:6.1f} MB max RSS (+{(rss - baseline_rss) / 1024:.1f} MB)"
+        )
+
+
+if __name__ == "__main__":
+    main()
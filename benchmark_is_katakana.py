@@ -0,0 +1,90 @@
+"""
+katakana_map_validator.is_katakana() と、従来の文字ごとに unicodedata.name() を呼ぶ is_katakana() を比較するベンチマーク
+
+以下の入力で 2 つの関数の判定結果が一致することを確認した後、マージ済みの辞書の全ての値とキーの判定にかかる時間を比較する。
+
+- マージ済みの辞書 (katakana_map_merged.json) の全ての値とキー
+- 全ての Unicode のコードポイント 1 文字ずつ (KATAKANA_BLOCKS の外に有効な文字がないことの確認を兼ねる)
+  ただし、従来の関数が文字名を持たない文字で ValueError を送出する場合は False とみなす
+- KATAKANA_CHARS の各文字に、KATAKANA_CHARS と半角カタカナの各文字を続けた 2 文字
+
+$ python benchmark_is_katakana.py [katakana_map_merged.json]
+"""
+
+import json
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+from katakana_map_validator import KATAKANA_CHARS, is_katakana
+
+
+REPEAT = 5
+
+
+def legacy_normalize_katakana(text):
+    text = unicodedata.normalize("NFKC", text)  # 正規化
+    text = text.replace("\u3099", "")  # 結合文字の濁点を削除、る゙ → る
+    text = text.replace("\u309A", "")  # 結合文字の半濁点を削除、な゚ → な
+    return text
+
+
+def legacy_is_katakana(text):
+    text = legacy_normalize_katakana(text)
+    return all(
+        (
+            unicodedata.category(char) in ["Lo", "Lm", "Sk", "Mn", "Pd"]
+            and unicodedata.name(char).startswith(("KATAKANA", "HALFWIDTH KATAKANA"))
+        )
+        or char == "ー"  # 伸ばす棒はカタカナ以外でも OK
+        or char == "・"  # 中点はカタカナ以外でも OK
+        for char in text
+    )
+
+
+def best_time(func) -> float:
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def legacy_result(text: str) -> bool:
+    # 文字名を持たない文字 (西夏文字など) では、従来の関数は unicodedata.name() の ValueError で失敗していた
+    try:
+        return legacy_is_katakana(text)
+    except ValueError:
+        return False
+
+
+def check_equivalence(texts: list[str], label: str) -> None:
+    mismatches = [text for text in texts if is_katakana(text) != legacy_result(text)]
+    assert not mismatches, f"{label}: {len(mismatches)} mismatches, e.g. {mismatches[:5]!r}"
+    print(f"{label}: {len(texts)} inputs match")
+
+
+def main() -> None:
+    current_dir = Path(__file__).parent
+    input_file = Path(sys.argv[1]) if len(sys.argv) > 1 else current_dir / "katakana_map_merged.json"
+    with open(input_file, "r", encoding="utf-8") as f:
+        katakana_map = json.load(f)
+    texts = [*katakana_map.values(), *katakana_map]
+
+    # 結果が一致することを確認
+    check_equivalence(texts, input_file.name)
+    check_equivalence([chr(cp) for cp in range(sys.maxunicode + 1) if not 0xD800 <= cp <= 0xDFFF], "code points")
+    halfwidth_chars = [chr(cp) for cp in range(0xFF61, 0xFFA0)]
+    check_equivalence([first + second for first in KATAKANA_CHARS for second in [*KATAKANA_CHARS, *halfwidth_chars]], "pairs")
+
+    legacy = best_time(lambda: [legacy_is_katakana(text) for text in texts])
+    current = best_time(lambda: [is_katakana(text) for text in texts])
+    print(f"{len(texts)} values and keys from {input_file.name}")
+    print(f"legacy is_katakana():    {legacy * 1000:.1f}ms")
+    print(f"is_katakana():           {current * 1000:.1f}ms ({legacy / current:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
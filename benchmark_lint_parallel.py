@@ -0,0 +1,63 @@
+"""
+katakana_map_lint.lint() を直列に実行した場合と、ProcessPoolExecutor で並列に実行した場合を比較するベンチマーク
+
+data.py の KATAKANA_MAP のエントリーを、キーに連番を付けて複製した大きな候補の辞書を作り、
+既定で有効なルールで検証する。並列に検証した結果が直列の結果と完全に一致することを確認した後、プロセス数ごとの時間を比較する。
+
+$ python benchmark_lint_parallel.py
+"""
+
+import os
+import time
+
+from data import KATAKANA_MAP
+from katakana_map_lint import lint, select_rules
+
+
+ENTRY_COUNT = 2_000_000
+
+REPEAT = 3
+
+
+def make_entries() -> dict[str, str]:
+    entries = {}
+    copy = 0
+    while len(entries) < ENTRY_COUNT:
+        for key, value in KATAKANA_MAP.items():
+            entries[f"{key}{copy}" if copy else key] = value
+            if len(entries) >= ENTRY_COUNT:
+                break
+        copy += 1
+    return entries
+
+
+def best_time(func) -> float:
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    entries = make_entries()
+    rules = select_rules()
+    cpu_count = os.cpu_count() or 1
+    job_counts = sorted({1, 2, 4, cpu_count})
+
+    # 結果が一致することを確認
+    expected = lint("merged", entries, rules)
+    for jobs in job_counts:
+        assert lint("merged", entries, rules, jobs=jobs) == expected, f"jobs={jobs} differs from serial"
+    print(f"{len(entries)} entries, {len(expected)} findings, identical for jobs={job_counts} ({cpu_count} CPUs)")
+
+    serial = best_time(lambda: lint("merged", entries, rules))
+    print(f"serial:  {serial * 1000:.1f}ms")
+    for jobs in job_counts[1:]:
+        parallel = best_time(lambda: lint("merged", entries, rules, jobs=jobs))
+        print(f"jobs={jobs}:  {parallel * 1000:.1f}ms ({serial / parallel:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+KatakanaMapIndex.lookup_many() と、リスト内包表記でトークンごとに dict.get() を呼ぶ場合の検索速度を比較するベンチマーク
+
+data.py の KATAKANA_MAP のキーと辞書にない単語を混ぜたトークン列を作り、それぞれの方法で全てのトークンを検索する。
+
+$ python benchmark_lookup_many.py
+"""
+
+import random
+import time
+
+import numpy as np
+
+from data import KATAKANA_MAP
+from katakana_map_lookup import KatakanaMapIndex
+
+
+TOKEN_COUNT = 1_000_000
+
+# 辞書に存在するトークンの割合
+HIT_RATIO = 0.7
+
+REPEAT = 5
+
+
+def make_tokens() -> list[str]:
+    random.seed(0)
+    keys = list(KATAKANA_MAP)
+    tokens = []
+    for index in range(TOKEN_COUNT):
+        if random.random() < HIT_RATIO:
+            tokens.append(random.choice(keys))
+        else:
+            tokens.append(f"{random.choice(keys)}xq{index % 1000}")
+    return tokens
+
+
+def best_time(func) -> float:
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    tokens = make_tokens()
+    token_array = np.array(tokens, dtype=str)
+    index = KatakanaMapIndex(KATAKANA_MAP)
+
+    # 結果が一致することを確認
+    readings, hits = index.lookup_many(tokens)
+    expected = [KATAKANA_MAP.get(token) for token in tokens]
+    assert readings.tolist() == expected
+    assert hits.tolist() == [reading is not None for reading in expected]
+
+    baseline = best_time(lambda: [KATAKANA_MAP.get(token) for token in tokens])
+    from_list = best_time(lambda: index.lookup_many(tokens))
+    from_array = best_time(lambda: index.lookup_many(token_array))
+
+    print(f"{TOKEN_COUNT} tokens ({HIT_RATIO:.0%} hits), {len(KATAKANA_MAP)} keys")
+    print(f"[KATAKANA_MAP.get(t) for t in tokens]   {baseline * 1000:8.1f} ms")
+    print(f"lookup_many(list)                       {from_list * 1000:8.1f} ms ({baseline / from_list:.2f}x)")
+    print(f"lookup_many(np.ndarray of str)          {from_array * 1000:8.1f} ms ({baseline / from_array:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -40,8 +40,12 @@ def extract_words(cmudict_content: str, output_file: Path) -> None:
     print(f"Extracted {len(sorted_words)} unique words.")
 
 
-# Usage
-current_dir = Path(__file__).parent
-output_file = current_dir / "cmudict_words.txt"
-cmudict_content = download_cmudict()
-extract_words(cmudict_content, output_file)
+def main() -> None:
+    current_dir = Path(__file__).parent
+    output_file = current_dir / "cmudict_words.txt"
+    cmudict_content = download_cmudict()
+    extract_words(cmudict_content, output_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -42,13 +42,8 @@ def process_line(line: str) -> tuple[str, str] | None:
     except Exception:
         return None
 
-def main() -> None:
-    current_dir = Path(__file__).parent
-    output_file = current_dir / 'katakana_map_jawiki.json'
-
-    # MeCab辞書をダウンロードして処理
-    csv_content = download_mecab_dict()
-
+def convert_mecab_dict(csv_content: str) -> dict[str, str]:
+    """MeCab辞書データを、アルファベット順にソートした {単語: カタカナ} の辞書に変換する"""
     # CSVを1行ずつ処理
     katakana_map = {}
     for line in csv_content.splitlines():
@@ -158,13 +153,23 @@ def main() -> None:
     katakana_map = {k: v for k, v in katakana_map.items() if k not in BLACKLIST}
 
     # アルファベット順にソート
-    katakana_map = dict(sorted(katakana_map.items(), key=lambda x: x[0].lower()))
+    return dict(sorted(katakana_map.items(), key=lambda x: x[0].lower()))
 
-    # 結果を保存
+def save_katakana_map(katakana_map: dict[str, str], output_file: Path) -> None:
+    """変換結果をJSONとして保存する"""
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(katakana_map, f, ensure_ascii=False, indent=4)
 
     print(f'Processed dictionary saved to {output_file}')
 
+def main() -> None:
+    current_dir = Path(__file__).parent
+    output_file = current_dir / 'katakana_map_jawiki.json'
+
+    # MeCab辞書をダウンロードして処理
+    csv_content = download_mecab_dict()
+    katakana_map = convert_mecab_dict(csv_content)
+    save_katakana_map(katakana_map, output_file)
+
 if __name__ == '__main__':
     main()
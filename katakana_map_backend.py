@@ -0,0 +1,325 @@
+"""
+katakana_map_gen.py から読みの生成に使うバックエンドをまとめたモジュール
+
+バックエンドは、英単語のリストを受け取り、{単語: カタカナ} の dict を返す非同期メソッド generate() を持つ。
+返す dict に含まれない単語やカタカナ以外の文字を含む読みは、呼び出し側で検証して再送する。
+呼び出し側は、レートリミッターの枠を取得する前に replay() で保存済みのレスポンスを探し、見つからなかった場合のみ generate() を呼ぶ。
+
+- GeminiBackend: Gemini API で読みを生成する (google-generativeai は最初のリクエストの時点で読み込み、設定する)
+  ResponseCache を渡すと、生のレスポンスをディスクにキャッシュし、同じリクエストに対しては replay() でキャッシュから応答する
+- FakeBackend: ネットワークに接続せずに、規則に基づいた読みを返す (遅延とエラーを注入できる)
+"""
+
+import asyncio
+import csv
+import io
+import os
+import random
+from typing import Protocol
+
+from katakana_map_fallback import LETTER_READINGS
+from katakana_map_ratelimit import MalformedResponseError, estimate_tokens
+from katakana_map_response_cache import ResponseCache
+
+
+MODEL_NAME = "gemini-1.5-flash-exp-0827"
+
+GENERATION_CONFIG = {
+    "temperature": 1,
+    "top_p": 0.95,
+    "top_k": 64,
+    "max_output_tokens": 8192,
+    "response_mime_type": "text/plain",
+}
+
+# See https://ai.google.dev/gemini-api/docs/safety-settings
+SYSTEM_INSTRUCTION = """あなたは英単語をカタカナ英語に変換する専門家です。以下の厳密なルールに従って変換を行ってください：
+
+1. 入力: 改行区切りの英単語リストが与えられます。
+2. 出力: 各単語をカタカナ英語に変換し、CSV形式で返してください。
+
+変換ルール:
+- 全ての入力単語を必ず変換すること。
+- 単語数は必ず入力と出力で一致させること。例えば入力が100単語あれば出力も100単語でなければならない。このルールは絶対である。
+- ミススペルや不自然な単語でも必ず変換すること。
+- 日本で一般的に使用されるカタカナ英語を優先すること。例: "orange" → "オレンジ"
+- 固有名詞も可能な限り一般的な読み方で変換すること。
+- 略語やアクロニムは一般的な読み方で変換すること。例: "NASA" → "ナサ"
+- 変換結果は必ずカタカナのみで構成すること。アルファベットや平仮名を含めないこと。
+- 日本語への翻訳は行わないこと。例: "apple" → "アップル"（"りんご"ではない）
+- "chugoku" のような日本語と思われるローマ字であっても、必ずカタカナ英語で変換すること。 例: "chugoku" → "チュウゴク"
+- "directv" のような英語の固有名詞であっても、必ずアルファベットを用いず発音のカタカナ英語で変換すること。 例: "directv" → "ディレクティービー"
+- "extrasensory" のような複雑な英語の名詞であっても、必ずアルファベットを用いず発音のカタカナ英語で変換すること。 例: "extrasensory" → "エクストラセンソリー"
+- "fenech" のようなマイナーな人名であっても、必ずアルファベットを用いず発音のカタカナ英語で変換すること。 例: "fenech" → "フェネッチ"
+- "honduran" のような国名や国の人々の名前であっても、"ホンジュラス人" とはせず、必ずカタカナ英語で変換すること。 例: "honduran" → "ホンジュラン", "kuwaiti" → "クウェーティ", "palestinian" → "パレスティニアン"
+- 長音符（ー）を適切に使用すること。例: "computer" → "コンピューター"
+- 促音や拗音を正確に表現すること。例: "application" → "アプリケーション"
+- 複数形はちゃんと s をカタカナで表現すること。例: "apples" → "アップルズ"
+
+出力フォーマット:
+apple,アップル
+banana,バナナ
+cherry,チェリー
+donut,ドーナツ
+...
+
+この任務は極めて重要です。一つでも間違いや抜け漏れがあると深刻な問題につながります。細心の注意を払って作業してください。"""
+
+FEW_SHOT_HISTORY = [
+    {
+        "role": "user",
+        "parts": [
+            """
+                    aaa
+                    aaberg
+                    aachen
+                    aachener
+                    aaker
+                    aalborg
+                    aalburg
+                    aalen
+                    aaliyah
+                    aalseth
+                    alpern
+                    fenech
+                    judo
+                    jujitsu
+                    kuwaiti
+                    mombasa
+                    naacp
+                    norinko
+                    plimpton
+            """.strip(),
+        ],
+    },
+    {
+        "role": "model",
+        "parts": [
+            """
+                    aaa,トリプルエー
+                    aaberg,アーバーグ
+                    aachen,アーヘン
+                    aachener,アーヘナー
+                    aaker,アーカー
+                    aalborg,オールボー
+                    aalburg,アールブルフ
+                    aalen,アーレン
+                    aaliyah,アリーヤ
+                    aalseth,オルセス
+                    alpern,アルペルン
+                    fenech,フェネック
+                    judo,ジュウドー
+                    jujitsu,ジュジツ
+                    kuwaiti,クウェーティ
+                    mombasa,モンバサ
+                    naacp,エヌエーエーシーピー
+                    norinko,ノリンコ
+                    plimpton,プリンプトン
+            """.strip(),
+        ],
+    },
+]
+
+
+# 処理対象の単語リストに含まれないダミーワードを追加する
+DUMMY_WORDS = ["apple", "banana", "cherry", "date", "watermelon"]
+
+
+class GenerationResult(dict):
+    """generate() の戻り値: {単語: カタカナ} の dict に、リクエストで消費したトークン数 (不明な場合は None) を持たせたもの"""
+
+    def __init__(
+        self,
+        entries: dict[str, str],
+        total_tokens: int | None = None,
+        cached: bool = False,
+        truncated: bool = False,
+        input_tokens: int | None = None,
+        output_tokens: int | None = None,
+    ) -> None:
+        super().__init__(entries)
+        self.total_tokens = total_tokens
+        # 入力 (プロンプト) と出力のトークン数の内訳
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        # キャッシュから応答した場合は True
+        self.cached = cached
+        # 出力が max_output_tokens で打ち切られた場合は True
+        self.truncated = truncated
+
+
+class GenerationBackend(Protocol):
+    """読みの生成に使うバックエンドのインターフェイス"""
+
+    def replay(self, words: list[str]) -> GenerationResult | None:
+        """モデルを呼び出さずに応答できる場合はその結果を、できない場合は None を返す"""
+        ...
+
+    async def generate(self, words: list[str]) -> GenerationResult: ...
+
+
+def parse_csv_response(text: str) -> dict[str, str]:
+    """"単語,カタカナ" 形式の CSV のレスポンスを解析する。1 行も読み取れない場合は MalformedResponseError を送出する"""
+    csv_reader = csv.reader(io.StringIO(text))
+    entries = {row[0]: row[1].replace(" ", "") for row in csv_reader if len(row) == 2}
+    if not entries:
+        raise MalformedResponseError("No CSV rows found in the response")
+    return entries
+
+
+class GeminiBackend:
+    """Gemini API で読みを生成するバックエンド"""
+
+    def __init__(self, model_name: str = MODEL_NAME, api_key: str | None = None, cache: ResponseCache | None = None) -> None:
+        self.model_name = model_name
+        self.api_key = api_key
+        self.model = None
+        self.cache = cache
+        # この実行中にキャッシュから応答したキー
+        # 同じリクエストを再送するのは前回のレスポンスに問題があった場合なので、2 回目以降はモデルを呼び出す
+        self.replayed_keys: set[str] = set()
+
+    def get_model(self):
+        # import 時に API キーを要求しないよう、最初のリクエストの時点で SDK を読み込んで設定する
+        if self.model is None:
+            import google.generativeai as genai
+            from google.generativeai.types import HarmBlockThreshold, HarmCategory
+
+            genai.configure(api_key=self.api_key or os.environ["GEMINI_API_KEY"])
+            self.model = genai.GenerativeModel(
+                model_name=self.model_name,
+                generation_config=GENERATION_CONFIG,
+                safety_settings={
+                    # 制限を全部解除
+                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+                },
+                system_instruction=SYSTEM_INSTRUCTION,
+            )
+        return self.model
+
+    def request_for(self, words: list[str]) -> tuple[str, list[str], str | None]:
+        """リクエストの入力テキスト、追加したダミー単語、キャッシュのキー (キャッシュしない場合は None) を返す"""
+        dummy_words = [word for word in DUMMY_WORDS if word not in words]
+        input_text = "\n".join(words + dummy_words)
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(self.model_name, GENERATION_CONFIG, SYSTEM_INSTRUCTION, FEW_SHOT_HISTORY, input_text)
+        return input_text, dummy_words, key
+
+    def replay(self, words: list[str]) -> GenerationResult | None:
+        _, dummy_words, key = self.request_for(words)
+        if key is None or key in self.replayed_keys:
+            return None
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        self.replayed_keys.add(key)
+        # キャッシュから応答した場合はトークンを消費しない
+        entries = self.parse(cached["text"], dummy_words)
+        return GenerationResult(entries, 0, cached=True, truncated=cached.get("truncated", False))
+
+    async def generate(self, words: list[str]) -> GenerationResult:
+        input_text, dummy_words, key = self.request_for(words)
+        # send_message() すると不要な履歴がどんどん積もっていくため、都度新しいセッションを作成する
+        chat_session = self.get_model().start_chat(history=FEW_SHOT_HISTORY)
+        response = await chat_session.send_message_async(input_text)
+        entries = self.parse(response.text, dummy_words)
+        usage = getattr(response, "usage_metadata", None)
+        total_tokens = usage.total_token_count if usage is not None else None
+        input_tokens = usage.prompt_token_count if usage is not None else None
+        output_tokens = usage.candidates_token_count if usage is not None else None
+        truncated = any(
+            getattr(candidate.finish_reason, "name", None) == "MAX_TOKENS" for candidate in response.candidates
+        )
+        # CSV として解析できたレスポンスのみキャッシュする
+        if key is not None:
+            self.cache.put(key, {"text": response.text, "total_tokens": total_tokens, "truncated": truncated})
+        return GenerationResult(
+            entries, total_tokens, truncated=truncated, input_tokens=input_tokens, output_tokens=output_tokens
+        )
+
+    @staticmethod
+    def parse(text: str, dummy_words: list[str]) -> dict[str, str]:
+        entries = parse_csv_response(text)
+        # ダミー単語を除去
+        for dummy in dummy_words:
+            entries.pop(dummy, None)
+        return entries
+
+
+class FakeBackendError(Exception):
+    """FakeBackend が注入するエラー (メッセージは Gemini API の実際のエラーに似せてある)"""
+
+
+# FakeBackend が注入するエラーの種類と、送出する例外
+FAKE_ERRORS = {
+    "quota": lambda: FakeBackendError("429 Resource has been exhausted (e.g. check quota)."),
+    "safety": lambda: FakeBackendError("The response was blocked by the safety filters."),
+    "malformed": lambda: MalformedResponseError("No CSV rows found in the response"),
+    "transient": lambda: FakeBackendError("503 The service is currently unavailable."),
+}
+
+
+def fake_reading(word: str) -> str:
+    """単語の英数字を 1 文字ずつ読み上げた読みを返す"""
+    return "".join(LETTER_READINGS.get(char, "") for char in word.upper()) or "ー"
+
+
+class FakeBackend:
+    """
+    ネットワークに接続せずに読みを返す、負荷試験用のバックエンド
+
+    readings に含まれる単語はその読みを、それ以外の単語は fake_reading() の読みを返す。
+    各リクエストは latency 秒の前後 50% の範囲でランダムに遅延し、error_rates に指定した確率でエラーの種類ごとの例外を送出する。
+    missing_rate の確率で単語を結果から取り除き、読みの抜け漏れを再現する。
+    出力のトークン数の見積もりが max_output_tokens を超えた場合は、それ以降の単語を取り除いて打ち切りを再現する。
+    """
+
+    def __init__(
+        self,
+        readings: dict[str, str] | None = None,
+        latency: float = 0.5,
+        error_rates: dict[str, float] | None = None,
+        missing_rate: float = 0.0,
+        max_output_tokens: int = GENERATION_CONFIG["max_output_tokens"],
+        seed: int | None = None,
+    ) -> None:
+        self.readings = readings or {}
+        self.latency = latency
+        self.error_rates = error_rates or {}
+        self.missing_rate = missing_rate
+        self.max_output_tokens = max_output_tokens
+        self.random = random.Random(seed)
+
+    def replay(self, words: list[str]) -> GenerationResult | None:
+        return None
+
+    async def generate(self, words: list[str]) -> GenerationResult:
+        await asyncio.sleep(self.latency * self.random.uniform(0.5, 1.5))
+        for kind, rate in self.error_rates.items():
+            if self.random.random() < rate:
+                raise FAKE_ERRORS[kind]()
+        entries = {}
+        output_tokens = 0
+        truncated = False
+        for word in words:
+            if self.random.random() < self.missing_rate:
+                continue
+            reading = self.readings.get(word) or fake_reading(word)
+            # 英語はおおよそ 4 文字で 1 トークン、カタカナはおおよそ 1 文字で 1 トークンとする
+            output_tokens += estimate_tokens(word) + len(reading) + 1
+            if output_tokens > self.max_output_tokens:
+                truncated = True
+                break
+            entries[word] = reading
+        input_tokens = estimate_tokens("\n".join(words))
+        return GenerationResult(
+            entries,
+            input_tokens + output_tokens,
+            truncated=truncated,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+        )
@@ -0,0 +1,171 @@
+"""
+マージ済みのカタカナ辞書をバイナリ形式にコンパイルし、mmap で読み込むためのモジュール
+
+katakana_map_merged.json や data.py の dict は、プロセスごとに全体を Python オブジェクトとして展開する必要がある。
+このモジュールが出力するバイナリ辞書は、ソート済みのキー表・オフセット配列・UTF-8 の値ヒープのみで構成されており、
+mmap で開くだけで二分探索による検索ができる。読み込みは O(1) で、複数のワーカープロセスが同じファイルを開いた場合は
+OS のページキャッシュを通じて同じページが共有される。
+
+ファイルフォーマット (全てリトルエンディアン):
+- ヘッダー: マジックナンバー b"KMAP" (4 バイト) / バージョン (uint32) / エントリー数 N (uint32)
+- エントリー表:
+    - キーのオフセット配列 (uint32 x (N + 1))
+    - 値のオフセット配列 (uint32 x (N + 1))
+    - キーのヒープ (UTF-8 バイト列を連結したもの)
+    - 値のヒープ (UTF-8 バイト列を連結したもの)
+
+キーは UTF-8 のバイト列としてソートされている。
+
+$ python katakana_map_binary.py [katakana_map_merged.json] [katakana_map_merged.kmap]
+"""
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+
+MAGIC = b"KMAP"
+VERSION = 1
+HEADER = struct.Struct("<4sII")
+OFFSET = struct.Struct("<I")
+
+
+def pack_entry_table(entries: Iterable[tuple[bytes, bytes]]) -> bytes:
+    """(キー, 値) のバイト列のペアを、オフセット配列とヒープからなるエントリー表にパックする"""
+    key_offsets = array("I", [0])
+    value_offsets = array("I", [0])
+    key_heap = bytearray()
+    value_heap = bytearray()
+    for key, value in entries:
+        key_heap += key
+        value_heap += value
+        key_offsets.append(len(key_heap))
+        value_offsets.append(len(value_heap))
+    if sys.byteorder != "little":
+        key_offsets.byteswap()
+        value_offsets.byteswap()
+    return key_offsets.tobytes() + value_offsets.tobytes() + bytes(key_heap) + bytes(value_heap)
+
+
+class EntryTable:
+    """pack_entry_table() でパックされたエントリー表を、バッファ上から直接読み出すクラス"""
+
+    def __init__(self, buffer, offset: int, count: int) -> None:
+        self.buffer = buffer
+        self.count = count
+        self.key_offsets_start = offset
+        self.value_offsets_start = offset + OFFSET.size * (count + 1)
+        self.key_heap_start = self.value_offsets_start + OFFSET.size * (count + 1)
+        key_heap_size = self.offset_at(self.key_offsets_start, count)
+        self.value_heap_start = self.key_heap_start + key_heap_size
+        value_heap_size = self.offset_at(self.value_offsets_start, count)
+        # エントリー表の直後の位置
+        self.end = self.value_heap_start + value_heap_size
+
+    def offset_at(self, array_start: int, index: int) -> int:
+        return OFFSET.unpack_from(self.buffer, array_start + OFFSET.size * index)[0]
+
+    def key_at(self, index: int) -> bytes:
+        start = self.offset_at(self.key_offsets_start, index)
+        end = self.offset_at(self.key_offsets_start, index + 1)
+        return self.buffer[self.key_heap_start + start : self.key_heap_start + end]
+
+    def value_at(self, index: int) -> bytes:
+        start = self.offset_at(self.value_offsets_start, index)
+        end = self.offset_at(self.value_offsets_start, index + 1)
+        return self.buffer[self.value_heap_start + start : self.value_heap_start + end]
+
+
+def compile_katakana_map(katakana_map: dict[str, str], output_file: Path) -> None:
+    """カタカナ辞書をバイナリ形式にコンパイルして保存する"""
+    entries = sorted((key.encode("utf-8"), value.encode("utf-8")) for key, value in katakana_map.items())
+    with open(output_file, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+        f.write(pack_entry_table(entries))
+
+
+class BinaryKatakanaMap:
+    """
+    compile_katakana_map() で作成したバイナリ辞書を mmap で開き、dict と同様のインターフェイスで検索するクラス
+
+    キーは二分探索で検索するため、検索のたびに Python オブジェクトが作られるのは比較対象のキーと結果の値のみとなる。
+    """
+
+    def __init__(self, path: Path) -> None:
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self.mmap.close()
+            raise ValueError(f"{path} is not a katakana map binary (version {VERSION})")
+        self.table = EntryTable(self.mmap, HEADER.size, count)
+
+    def close(self) -> None:
+        self.mmap.close()
+
+    def __enter__(self) -> "BinaryKatakanaMap":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def find(self, key: str) -> int:
+        """キーのインデックスを二分探索で返す。見つからない場合は -1 を返す"""
+        target = key.encode("utf-8")
+        low, high = 0, self.table.count
+        while low < high:
+            middle = (low + high) // 2
+            middle_key = self.table.key_at(middle)
+            if middle_key < target:
+                low = middle + 1
+            elif middle_key > target:
+                high = middle
+            else:
+                return middle
+        return -1
+
+    def get(self, key: str, default: str | None = None) -> str | None:
+        index = self.find(key)
+        if index < 0:
+            return default
+        return self.table.value_at(index).decode("utf-8")
+
+    def __getitem__(self, key: str) -> str:
+        index = self.find(key)
+        if index < 0:
+            raise KeyError(key)
+        return self.table.value_at(index).decode("utf-8")
+
+    def __contains__(self, key: str) -> bool:
+        return self.find(key) >= 0
+
+    def __len__(self) -> int:
+        return self.table.count
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(self.table.count):
+            yield self.table.key_at(index).decode("utf-8")
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        for index in range(self.table.count):
+            yield self.table.key_at(index).decode("utf-8"), self.table.value_at(index).decode("utf-8")
+
+
+def main() -> None:
+    current_dir = Path(__file__).parent
+    input_file = Path(sys.argv[1]) if len(sys.argv) > 1 else current_dir / "katakana_map_merged.json"
+    output_file = Path(sys.argv[2]) if len(sys.argv) > 2 else input_file.with_suffix(".kmap")
+
+    with open(input_file, "r", encoding="utf-8") as f:
+        katakana_map = json.load(f)
+
+    compile_katakana_map(katakana_map, output_file)
+    print(f"Compiled {len(katakana_map)} entries to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""
+cmudict → 生成 → jawiki → マージ → 検証 → 書き出し のパイプラインを、入力が変わった段階だけ再実行するビルドドライバー
+
+各段階 (Stage) は、入力ファイル・出力ファイル・処理を宣言する。段階の入力が他の段階の出力であれば、その段階に依存する。
+段階を実行するたびに、入力と出力の内容の SHA-256 ハッシュを .build/state.json に記録し、
+次回のビルドでは以下の全てを満たす段階を最新とみなして実行を省く。
+
+- 出力が全て存在し、内容が前回実行後から変わっていない
+- 入力の内容が前回実行後から変わっていない
+
+ファイルのハッシュはサイズと更新日時 (ナノ秒) と一緒に記録し、どちらも変わっていないファイルは読み直さない。
+そのため、何も変わっていない状態でのビルドはファイルの stat のみで終わる。
+依存関係のない段階 (検証と 3 つのバイナリ形式の書き出しなど) は、別プロセスで並列に実行する。
+
+cmudict と jawiki のダウンロードと変換、LLM で読みを生成する generate の段階は、ネットワークや API キー、時間と費用が必要で、
+リポジトリに含まれる cmudict_words.txt / katakana_map_jawiki.json / katakana_map.json を書き換えるため、
+ターゲットとして明示的に指定した場合にのみ実行する。指定しない場合、これらのファイルはソースファイルとして扱う。
+ダウンロードの段階は入力を持たないため、指定しても出力が存在しない場合か --force を指定した場合にのみ実行する。
+
+$ python katakana_map_build.py [ターゲット ...] [--jobs N] [--force] [--dry-run]
+
+例えば、jawiki の辞書を取得し直してマージし直す場合は以下のように実行する。
+
+$ python katakana_map_build.py download_jawiki convert_jawiki merge --force
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import NamedTuple
+
+
+BUILD_DIR = ".build"
+STATE_FILE = f"{BUILD_DIR}/state.json"
+
+
+class Stage(NamedTuple):
+    name: str
+    # ルートディレクトリからの相対パス
+    inputs: tuple[str, ...]
+    outputs: tuple[str, ...]
+    # ルートディレクトリを受け取って出力を作成する関数 (別プロセスで実行するため、モジュールのトップレベルに定義する)
+    action: Callable[[Path], None]
+    # True の場合、ターゲットとして明示的に指定したときのみ実行する
+    explicit: bool = False
+
+
+def download_cmudict(root: Path) -> None:
+    from cmudict_download import download_cmudict
+
+    (root / BUILD_DIR / "cmudict.dict").write_text(download_cmudict(), encoding="utf-8")
+
+
+def extract_words(root: Path) -> None:
+    from cmudict_download import extract_words
+
+    extract_words((root / BUILD_DIR / "cmudict.dict").read_text(encoding="utf-8"), root / "cmudict_words.txt")
+
+
+def download_jawiki(root: Path) -> None:
+    from jawiki_dict_converter import download_mecab_dict
+
+    (root / BUILD_DIR / "mecab-userdic.csv").write_text(download_mecab_dict(), encoding="utf-8")
+
+
+def convert_jawiki(root: Path) -> None:
+    from jawiki_dict_converter import convert_mecab_dict, save_katakana_map
+
+    csv_content = (root / BUILD_DIR / "mecab-userdic.csv").read_text(encoding="utf-8")
+    save_katakana_map(convert_mecab_dict(csv_content), root / "katakana_map_jawiki.json")
+
+
+def generate(root: Path) -> None:
+    # API キーの読み込みや asyncio のイベントループを含め、コマンドラインから実行した場合と同じ状態で実行する
+    subprocess.run([sys.executable, str(root / "katakana_map_gen.py")], cwd=root, check=True)
+
+
+def merge(root: Path) -> None:
+    from katakana_map_cleaner import main
+
+    main()
+
+
+def validate(root: Path) -> None:
+    from katakana_map_lint import format_jsonl, lint, select_rules
+
+    with open(root / "katakana_map_merged.json", "r", encoding="utf-8") as f:
+        katakana_map = json.load(f)
+    findings = lint("merged", katakana_map, select_rules())
+    (root / BUILD_DIR / "validation.jsonl").write_text(format_jsonl(findings), encoding="utf-8")
+
+
+def export_binary(root: Path) -> None:
+    from katakana_map_binary import main
+
+    with patched_argv([str(root / "katakana_map_merged.json")]):
+        main()
+
+
+def export_trie(root: Path) -> None:
+    from katakana_map_trie import main
+
+    with patched_argv([str(root / "katakana_map_merged.json")]):
+        main()
+
+
+def export_mph(root: Path) -> None:
+    from katakana_map_mph import main
+
+    with patched_argv([str(root / "katakana_map_merged.json")]):
+        main()
+
+
+@contextlib.contextmanager
+def patched_argv(args: list[str]):
+    """sys.argv を読む main() を、引数を指定して呼び出すためのコンテキストマネージャー"""
+    original_argv = sys.argv
+    sys.argv = [original_argv[0], *args]
+    try:
+        yield
+    finally:
+        sys.argv = original_argv
+
+
+MERGE_SOURCES = (
+    "katakana_map.json",
+    "data.py",
+    "data_source.py",
+    "katakana_map_fix_s.json",
+    "katakana_map_manual_proper_noun.json",
+    "katakana_map_jawiki.json",
+    "katakana_map_manual_acronym.json",
+)
+
+# 処理するスクリプト自体も入力に含め、処理を変更した場合にも再実行する
+STAGES = [
+    Stage("download_cmudict", (), (f"{BUILD_DIR}/cmudict.dict",), download_cmudict, explicit=True),
+    Stage(
+        "extract_words",
+        (f"{BUILD_DIR}/cmudict.dict", "cmudict_download.py"),
+        ("cmudict_words.txt",),
+        extract_words,
+        explicit=True,
+    ),
+    Stage("download_jawiki", (), (f"{BUILD_DIR}/mecab-userdic.csv",), download_jawiki, explicit=True),
+    Stage(
+        "convert_jawiki",
+        (f"{BUILD_DIR}/mecab-userdic.csv", "jawiki_dict_converter.py"),
+        ("katakana_map_jawiki.json",),
+        convert_jawiki,
+        explicit=True,
+    ),
+    Stage(
+        "generate",
+        ("cmudict_words.txt", "katakana_map_gen.py", "katakana_map_backend.py", "katakana_map_validator.py"),
+        ("katakana_map.json",),
+        generate,
+        explicit=True,
+    ),
+    Stage(
+        "merge",
+        (
+            *MERGE_SOURCES,
+            "katakana_map_cleaner.py",
+            "katakana_map_merge.py",
+            "katakana_map_sources.py",
+            "katakana_map_lint.py",
+            "katakana_map_validator.py",
+        ),
+        ("katakana_map_merged.json",),
+        merge,
+    ),
+    Stage(
+        "validate",
+        ("katakana_map_merged.json", "katakana_map_lint.py", "katakana_map_validator.py"),
+        (f"{BUILD_DIR}/validation.jsonl",),
+        validate,
+    ),
+    Stage(
+        "export_binary",
+        ("katakana_map_merged.json", "katakana_map_binary.py"),
+        ("katakana_map_merged.kmap",),
+        export_binary,
+    ),
+    Stage(
+        "export_trie",
+        ("katakana_map_merged.json", "katakana_map_trie.py"),
+        ("katakana_map_merged.kmtr",),
+        export_trie,
+    ),
+    Stage(
+        "export_mph",
+        ("katakana_map_merged.json", "katakana_map_mph.py"),
+        ("katakana_map_merged.kmph",),
+        export_mph,
+    ),
+]
+STAGES_BY_NAME = {stage.name: stage for stage in STAGES}
+
+
+def run_stage(name: str, root: Path) -> None:
+    """段階を実行する (ProcessPoolExecutor のワーカープロセスから呼び出す)"""
+    os.chdir(root)
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+    (root / BUILD_DIR).mkdir(exist_ok=True)
+    STAGES_BY_NAME[name].action(root)
+
+
+class FileHasher:
+    """サイズと更新日時が変わっていないファイルのハッシュを、読み直さずに返すクラス"""
+
+    def __init__(self, root: Path, cache: dict[str, dict]) -> None:
+        self.root = root
+        self.cache = cache
+
+    def digest(self, path: str) -> str | None:
+        """ファイルの内容の SHA-256 ハッシュを返す。ファイルが存在しない場合は None を返す"""
+        try:
+            stat = os.stat(self.root / path)
+        except FileNotFoundError:
+            self.cache.pop(path, None)
+            return None
+        cached = self.cache.get(path)
+        if cached is not None and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+        sha256 = hashlib.sha256()
+        with open(self.root / path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(block)
+        self.cache[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256.hexdigest()}
+        return self.cache[path]["sha256"]
+
+    def digests(self, paths: tuple[str, ...]) -> dict[str, str | None]:
+        return {path: self.digest(path) for path in paths}
+
+
+class Builder:
+    """段階の依存関係を解決し、最新でない段階のみを実行するクラス"""
+
+    def __init__(self, root: Path, stages: list[Stage] = STAGES, jobs: int | None = None) -> None:
+        self.root = root
+        self.stages = {stage.name: stage for stage in stages}
+        self.jobs = jobs
+        self.state_path = root / STATE_FILE
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {"files": {}, "stages": {}}
+        self.hasher = FileHasher(root, self.state["files"])
+        # 出力ファイルから、それを作成する段階への対応
+        self.producers = {output: stage.name for stage in stages for output in stage.outputs}
+
+    def dependencies(self, stage: Stage, selected: set[str]) -> set[str]:
+        """stage が依存する段階のうち、selected に含まれるものを返す"""
+        return {self.producers[path] for path in stage.inputs if self.producers.get(path) in selected}
+
+    def select(self, targets: list[str]) -> set[str]:
+        """ターゲットと、それが依存する段階の名前の集合を返す (明示的な段階は、ターゲットとして指定した場合のみ含める)"""
+        if not targets:
+            targets = [stage.name for stage in self.stages.values() if not stage.explicit]
+        unknown = [target for target in targets if target not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown targets: {', '.join(unknown)} (available: {', '.join(self.stages)})")
+        selected: set[str] = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name in selected:
+                continue
+            selected.add(name)
+            for path in self.stages[name].inputs:
+                producer = self.producers.get(path)
+                if producer is not None and (not self.stages[producer].explicit or producer in targets):
+                    stack.append(producer)
+        return selected
+
+    def is_up_to_date(self, stage: Stage) -> bool:
+        record = self.state["stages"].get(stage.name)
+        if record is None:
+            return False
+        outputs = self.hasher.digests(stage.outputs)
+        if None in outputs.values() or outputs != record["outputs"]:
+            return False
+        return self.hasher.digests(stage.inputs) == record["inputs"]
+
+    def record(self, stage: Stage) -> None:
+        # merge のように入力のファイルを書き直す段階もあるため、入力のハッシュも実行後に記録する
+        self.state["stages"][stage.name] = {
+            "inputs": self.hasher.digests(stage.inputs),
+            "outputs": self.hasher.digests(stage.outputs),
+        }
+
+    def save_state(self) -> None:
+        self.state_path.parent.mkdir(exist_ok=True)
+        temporary_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(temporary_path, self.state_path)
+
+    def build(self, targets: list[str], force: bool = False, dry_run: bool = False) -> bool:
+        """ターゲットをビルドし、全ての段階が成功した場合は True を返す"""
+        selected = self.select(targets)
+        # 定義順に処理するため、同時に実行可能になった段階の順序と出力は常に同じになる
+        order = [name for name in self.stages if name in selected]
+        remaining = {name: self.dependencies(self.stages[name], selected) for name in order}
+        running: dict[Future, str] = {}
+        started_at: dict[str, float] = {}
+        failed: set[str] = set()
+        # dry_run で実行されるはずの段階 (これに依存する段階は、入力が変わるため最新であっても実行されるはず)
+        would_run: set[str] = set()
+        executor: ProcessPoolExecutor | None = None
+        try:
+            while remaining or running:
+                ready = [name for name, dependencies in remaining.items() if not dependencies]
+                for name in ready:
+                    del remaining[name]
+                    stage = self.stages[name]
+                    upstream = sorted(would_run & self.dependencies(stage, selected))
+                    if dry_run and upstream:
+                        print(f"[{name}] would run after {', '.join(upstream)}")
+                        would_run.add(name)
+                        self.finish(name, remaining)
+                    elif not force and self.is_up_to_date(stage):
+                        print(f"[{name}] up to date")
+                        self.finish(name, remaining)
+                    elif dry_run:
+                        print(f"[{name}] would run")
+                        would_run.add(name)
+                        self.finish(name, remaining)
+                    else:
+                        missing = [path for path in stage.inputs if self.hasher.digest(path) is None]
+                        if missing:
+                            producers = sorted({self.producers[path] for path in missing if path in self.producers})
+                            hint = f" (build {', '.join(producers)} to create them)" if producers else ""
+                            print(f"[{name}] failed: missing inputs {', '.join(missing)}{hint}")
+                            failed.add(name)
+                            self.skip_dependents(name, remaining, failed)
+                            continue
+                        # 何も実行しないビルドでプロセスを起動しないよう、プールは必要になってから作成する
+                        if executor is None:
+                            executor = ProcessPoolExecutor(max_workers=self.jobs)
+                        print(f"[{name}] running")
+                        running[executor.submit(run_stage, name, self.root)] = name
+                        started_at[name] = time.perf_counter()
+                if ready and not running:
+                    continue
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    elapsed = time.perf_counter() - started_at.pop(name)
+                    error = future.exception()
+                    if error is not None:
+                        print(f"[{name}] failed after {elapsed:.1f}s: {type(error).__name__}: {error}")
+                        failed.add(name)
+                        self.state["stages"].pop(name, None)
+                        self.skip_dependents(name, remaining, failed)
+                        continue
+                    print(f"[{name}] done in {elapsed:.1f}s")
+                    self.record(self.stages[name])
+                    self.finish(name, remaining)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            if not dry_run:
+                self.save_state()
+        return not failed
+
+    @staticmethod
+    def finish(name: str, remaining: dict[str, set[str]]) -> None:
+        """完了した段階を、それに依存する段階の待ち合わせから外す"""
+        for dependencies in remaining.values():
+            dependencies.discard(name)
+
+    def skip_dependents(self, name: str, remaining: dict[str, set[str]], failed: set[str]) -> None:
+        """失敗した段階に (間接的に) 依存する段階を実行対象から外す"""
+        for dependent in [dependent for dependent, dependencies in remaining.items() if name in dependencies]:
+            if dependent in remaining:
+                del remaining[dependent]
+                print(f"[{dependent}] skipped because {name} failed")
+                failed.add(dependent)
+                self.skip_dependents(dependent, remaining, failed)
+
+
+def main() -> None:
+    current_dir = Path(__file__).parent.resolve()
+    parser = argparse.ArgumentParser(description="Incrementally build the katakana map pipeline.")
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        help=f"stages to build (default: all except downloads and generate): {', '.join(STAGES_BY_NAME)}",
+    )
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of stages to run in parallel")
+    parser.add_argument("--force", action="store_true", help="run the selected stages even if they are up to date")
+    parser.add_argument("--dry-run", action="store_true", help="only print the stages that would run")
+    args = parser.parse_args()
+
+    started_at = time.perf_counter()
+    builder = Builder(current_dir, jobs=args.jobs)
+    try:
+        succeeded = builder.build(args.targets, force=args.force, dry_run=args.dry_run)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Build {'finished' if succeeded else 'failed'} in {(time.perf_counter() - started_at) * 1000:.1f}ms")
+    if not succeeded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
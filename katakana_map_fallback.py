@@ -0,0 +1,385 @@
+"""
+カタカナ辞書に存在しない単語の読みを、辞書に存在する単語から推定するフォールバック処理をまとめたモジュール
+
+FallbackLookup は、まず辞書を引き、見つからなかった場合にフォールバック処理を順に試す。
+各フォールバック処理は (単語, 辞書を引く関数) を受け取り、推定した読みか None を返す関数として実装する。
+辞書を引く関数は、辞書になければ他のフォールバック処理も試すため、smartphones → smartphone → smart + phone のように
+語幹の読みを別のフォールバック処理で推定できる。
+
+$ python katakana_map_fallback.py [katakana_map_merged.json] [katakana_map_pruned.json]
+"""
+
+import functools
+import json
+import math
+import sys
+from collections.abc import Callable, Sequence
+from pathlib import Path
+from typing import NamedTuple
+
+
+# 辞書を引く関数と、フォールバック処理の型
+Getter = Callable[[str], str | None]
+FallbackStage = Callable[[str, Getter], str | None]
+
+# 語幹として認める最短の長さ
+MIN_STEM_LENGTH = 3
+
+# 複数形の読み: 語幹の読みの末尾に応じて置き換える
+# katakana_map_cleaner.py の複数形チェックと同様に、結果は必ず ス / ズ / ツ / ヅ のいずれかで終わる
+PLURAL_ENDINGS = {
+    # box → boxes (ボックス → ボックシズ) のように、歯擦音で終わる語幹は「イズ」の音を足す
+    "ス": "シズ",
+    "ズ": "ジズ",
+    "シュ": "シズ",
+    "ジ": "ジズ",
+    "チ": "チズ",
+    # cat → cats (キャット → キャッツ) / bed → beds (ベッド → ベッズ)
+    "ト": "ツ",
+    "ド": "ズ",
+}
+# book → books (ブック → ブックス) のように、無声音で終わる語幹は「ス」を足す
+PLURAL_VOICELESS_ENDINGS = ("ク", "プ", "フ")
+
+# 過去形の読み
+PAST_ENDINGS = {
+    # want → wanted (ワント → ワンティド) / need → needed (ニード → ニーディド)
+    "ト": "ティド",
+    "ド": "ディド",
+}
+# walk → walked (ウォーク → ウォークト) のように、無声音で終わる語幹は「ト」を足す
+PAST_VOICELESS_ENDINGS = ("ク", "プ", "フ", "ス", "シュ", "チ")
+
+# 進行形の読み: zoom → zooming (ズーム → ズーミング) のように、語幹の末尾の音をイ段に変えて「ング」を足す
+ING_ENDINGS = {
+    "ク": "キング",
+    "グ": "ギング",
+    "ス": "シング",
+    "ズ": "ジング",
+    "シュ": "シング",
+    "ジ": "ジング",
+    "チ": "チング",
+    "ト": "ティング",
+    "ド": "ディング",
+    "ヌ": "ニング",
+    "ン": "ニング",
+    "フ": "フィング",
+    "ブ": "ビング",
+    "プ": "ピング",
+    "ム": "ミング",
+    "ル": "リング",
+}
+
+
+def replace_ending(reading: str, endings: dict[str, str]) -> str | None:
+    """読みの末尾が endings のいずれかのキーで終わる場合、その部分を置き換えた読みを返す"""
+    # 「シュ」のような 2 文字の音を優先して判定する
+    for ending in sorted(endings, key=len, reverse=True):
+        if reading.endswith(ending):
+            return reading[: -len(ending)] + endings[ending]
+    return None
+
+
+def pluralize_reading(stem: str, reading: str) -> str:
+    """語幹の読みから複数形 (-s / -es) の読みを作る"""
+    replaced = replace_ending(reading, PLURAL_ENDINGS)
+    if replaced is not None:
+        return replaced
+    if reading.endswith(PLURAL_VOICELESS_ENDINGS):
+        return reading + "ス"
+    return reading + "ズ"
+
+
+def past_reading(stem: str, reading: str) -> str:
+    """語幹の読みから過去形 (-ed) の読みを作る"""
+    replaced = replace_ending(reading, PAST_ENDINGS)
+    if replaced is not None:
+        return replaced
+    if reading.endswith(PAST_VOICELESS_ENDINGS):
+        return reading + "ト"
+    return reading + "ド"
+
+
+def ing_reading(stem: str, reading: str) -> str:
+    """語幹の読みから進行形 (-ing) の読みを作る"""
+    # wonder → wondering (ワンダー → ワンダリング) のように、r で終わる語幹の長音は「リング」にする
+    if stem.endswith("r") and reading.endswith("ー"):
+        return reading[:-1] + "リング"
+    replaced = replace_ending(reading, ING_ENDINGS)
+    if replaced is not None:
+        return replaced
+    return reading + "イング"
+
+
+def stem_candidates(word: str, suffix: str) -> list[str]:
+    """
+    word から規則的な接尾辞 suffix を取り除いた語幹の候補を返す
+
+    cities → city / making → make / zipped → zip のような綴りの変化も考慮する。
+    """
+    if not word.endswith(suffix):
+        return []
+    stem = word[: -len(suffix)]
+    candidates = [stem]
+    if suffix == "s":
+        # boxes → box / cities → city
+        if stem.endswith("e"):
+            candidates.append(stem[:-1])
+        if stem.endswith("ie"):
+            candidates.append(stem[:-2] + "y")
+    else:
+        # making → make / loved → love
+        # wiped → wipe (wip ではない) のように、e を補った語幹を優先する
+        candidates.insert(0, stem + "e")
+        # tried → try
+        if stem.endswith("i"):
+            candidates.append(stem[:-1] + "y")
+        # zipping → zip / stopped → stop
+        if len(stem) >= 2 and stem[-1] == stem[-2]:
+            candidates.append(stem[:-1])
+    return [candidate for candidate in candidates if len(candidate) >= MIN_STEM_LENGTH]
+
+
+# 接尾辞と、語幹とその読みから派生形の読みを作る関数の組
+INFLECTIONS: list[tuple[str, Callable[[str, str], str]]] = [
+    ("s", pluralize_reading),
+    ("ed", past_reading),
+    ("ing", ing_reading),
+]
+
+
+def inflection_fallback(word: str, get: Getter) -> str | None:
+    """規則的な接尾辞 (-s / -es / -ed / -ing) を取り除いた語幹が辞書にあれば、その読みから派生形の読みを作る"""
+    for suffix, make_reading in INFLECTIONS:
+        for stem in stem_candidates(word, suffix):
+            reading = get(stem)
+            if reading is not None:
+                return make_reading(stem, reading)
+    return None
+
+
+# 頭字語を 1 文字ずつ読み上げるときの各文字の読み (katakana_map_manual_acronym.json の表記に合わせる)
+LETTER_READINGS = {
+    "A": "エー",
+    "B": "ビー",
+    "C": "シー",
+    "D": "ディー",
+    "E": "イー",
+    "F": "エフ",
+    "G": "ジー",
+    "H": "エイチ",
+    "I": "アイ",
+    "J": "ジェー",
+    "K": "ケー",
+    "L": "エル",
+    "M": "エム",
+    "N": "エヌ",
+    "O": "オー",
+    "P": "ピー",
+    "Q": "キュー",
+    "R": "アール",
+    "S": "エス",
+    "T": "ティー",
+    "U": "ユー",
+    "V": "ブイ",
+    "W": "ダブリュー",
+    "X": "エックス",
+    "Y": "ワイ",
+    "Z": "ゼット",
+    "0": "ゼロ",
+    "1": "ワン",
+    "2": "ツー",
+    "3": "スリー",
+    "4": "フォー",
+    "5": "ファイブ",
+    "6": "シックス",
+    "7": "セブン",
+    "8": "エイト",
+    "9": "ナイン",
+}
+LETTER_TRANSLATION = str.maketrans(LETTER_READINGS)
+ACRONYM_CHARS = "".join(LETTER_READINGS)
+
+
+@functools.lru_cache(maxsize=65536)
+def spell_acronym(word: str) -> str | None:
+    """
+    XKCD → エックスケーシーディー のように、大文字と数字のみからなる単語を 1 文字ずつ読み上げた読みを返す
+
+    大文字を 1 文字以上含み、2 文字以上の単語のみを対象とし、それ以外の場合は None を返す。
+    """
+    # 全ての文字が ACRONYM_CHARS に含まれていれば、strip() の結果は空文字列になる
+    if len(word) < 2 or word.strip(ACRONYM_CHARS) or word.isdigit():
+        return None
+    return word.translate(LETTER_TRANSLATION)
+
+
+def acronym_fallback(word: str, get: Getter) -> str | None:
+    """辞書にない頭字語を 1 文字ずつ読み上げる (katakana_map_manual_acronym.json の頭字語は辞書の読みが優先される)"""
+    return spell_acronym(word)
+
+
+class CompoundSplit(NamedTuple):
+    """CompoundSplitter による分割結果"""
+
+    pieces: list[str]
+    reading: str
+    confidence: float
+
+
+class CompoundSplitter:
+    """
+    smartphone → smart + phone のように、辞書にない連結語を辞書のキーの連結に分割して読みを推定するクラス
+
+    動的計画法で、分割数が最小となる分割を求める。分割数が同じ候補が複数ある場合は、
+    頻度ファイル (katakana_map_sources.load_word_frequencies() で読み込む) から求めた各部分の出現確率の積が最大となるものを選ぶ。
+    頻度ファイルがない場合など、それでも決まらない場合は最も短い部分が最も長いものを選ぶ
+    (notebook は not + ebook ではなく note + book とする)。
+    結果は LRU キャッシュに保持されるため、同じ未知語が繰り返し現れても分割は 1 回しか行われない。
+    """
+
+    def __init__(
+        self,
+        katakana_map,
+        frequencies: dict[str, int] | None = None,
+        min_piece_length: int = 3,
+        min_confidence: float = 0.5,
+        cache_size: int = 65536,
+    ) -> None:
+        self.katakana_map = katakana_map
+        self.frequencies = frequencies or {}
+        self.min_piece_length = min_piece_length
+        self.min_confidence = min_confidence
+        self.max_piece_length = max((len(key) for key in katakana_map), default=0)
+        # 出現回数に 1 を足して平滑化した確率の負の対数を、各部分のコストとする
+        self.total_frequency = sum(self.frequencies.values()) + len(katakana_map)
+        self.split = functools.lru_cache(maxsize=cache_size)(self.split_uncached)
+
+    def piece_cost(self, piece: str) -> float:
+        return -math.log((self.frequencies.get(piece, 0) + 1) / self.total_frequency)
+
+    def split_uncached(self, word: str) -> CompoundSplit | None:
+        """word を辞書のキーの連結に分割する。2 つ以上に分割できない場合は None を返す"""
+        word = word.lower()
+        length = len(word)
+        if length < self.min_piece_length * 2:
+            return None
+
+        # best[i] は word[:i] の最良の分割の (分割数, コスト, 最も短い部分の長さの符号を反転した値, 直前の分割位置)
+        best: list[tuple[int, float, int, int] | None] = [None] * (length + 1)
+        best[0] = (0, 0.0, -length, -1)
+        for start in range(length):
+            if best[start] is None:
+                continue
+            pieces, cost, negative_shortest, _ = best[start]
+            for end in range(start + self.min_piece_length, min(start + self.max_piece_length, length) + 1):
+                piece = word[start:end]
+                if piece not in self.katakana_map:
+                    continue
+                candidate = (pieces + 1, cost + self.piece_cost(piece), max(negative_shortest, -len(piece)), start)
+                if best[end] is None or candidate[:3] < best[end][:3]:
+                    best[end] = candidate
+
+        if best[length] is None or best[length][0] < 2:
+            return None
+
+        split_pieces = []
+        end = length
+        while end > 0:
+            start = best[end][3]
+            split_pieces.append(word[start:end])
+            end = start
+        split_pieces.reverse()
+
+        # 2 つに分割でき、どちらも 4 文字以上であれば 1.0 とし、分割数が増えるほど、短い部分を含むほど下げる
+        shortest = min(len(piece) for piece in split_pieces)
+        confidence = min(1.0, shortest / 4) / (len(split_pieces) - 1)
+        reading = "".join(self.katakana_map[piece] for piece in split_pieces)
+        return CompoundSplit(split_pieces, reading, confidence)
+
+    def __call__(self, word: str, get: Getter) -> str | None:
+        """FallbackLookup のフォールバック処理として、確信度が min_confidence 以上の分割結果の読みを返す"""
+        result = self.split(word)
+        if result is None or result.confidence < self.min_confidence:
+            return None
+        return result.reading
+
+
+class FallbackLookup:
+    """
+    辞書を引き、見つからなかった場合はフォールバック処理を順に試して読みを推定するクラス
+
+    stages を省略した場合は、inflection_fallback、acronym_fallback、CompoundSplitter の順に試す。
+    各フォールバック処理に渡す辞書を引く関数は、辞書になければ自身以外のフォールバック処理を 1 段だけ試す。
+    """
+
+    def __init__(self, katakana_map, stages: Sequence[FallbackStage] | None = None) -> None:
+        self.katakana_map = katakana_map
+        if stages is None:
+            stages = (inflection_fallback, acronym_fallback, CompoundSplitter(katakana_map))
+        self.stages = list(stages)
+        self.getters = [self.stem_getter(stage) for stage in self.stages]
+
+    def stem_getter(self, stage: FallbackStage) -> Getter:
+        """辞書になければ stage 以外のフォールバック処理を試して、語幹などの読みを引く関数を返す"""
+        other_stages = [other for other in self.stages if other is not stage]
+
+        def get(word: str) -> str | None:
+            reading = self.katakana_map.get(word)
+            if reading is not None:
+                return reading
+            # 他のフォールバック処理には辞書を引く関数をそのまま渡し、フォールバック処理が 2 段以上連鎖しないようにする
+            for other in other_stages:
+                reading = other(word, self.katakana_map.get)
+                if reading is not None:
+                    return reading
+            return None
+
+        return get
+
+    def get(self, word: str, default: str | None = None) -> str | None:
+        reading = self.katakana_map.get(word)
+        if reading is not None:
+            return reading
+        for stage, get in zip(self.stages, self.getters):
+            reading = stage(word, get)
+            if reading is not None:
+                return reading
+        return default
+
+
+def prune_derivable_entries(katakana_map: dict[str, str]) -> dict[str, str]:
+    """
+    inflection_fallback() で辞書の他のエントリーから全く同じ読みを導出できるエントリーを取り除いた辞書を返す
+
+    語幹は必ず派生形より短いため、短いキーから順に判定し、残したエントリーのみから導出できるかを確認する。
+    これにより、取り除いたエントリーは残した辞書と inflection_fallback() で必ず元の読みに復元できる。
+    """
+    kept: dict[str, str] = {}
+    for key in sorted(katakana_map, key=len):
+        if inflection_fallback(key, kept.get) != katakana_map[key]:
+            kept[key] = katakana_map[key]
+    # 元の辞書の順序を維持する
+    return {key: value for key, value in katakana_map.items() if key in kept}
+
+
+def main() -> None:
+    current_dir = Path(__file__).parent
+    input_file = Path(sys.argv[1]) if len(sys.argv) > 1 else current_dir / "katakana_map_merged.json"
+    output_file = Path(sys.argv[2]) if len(sys.argv) > 2 else current_dir / "katakana_map_pruned.json"
+
+    with open(input_file, "r", encoding="utf-8") as f:
+        katakana_map = json.load(f)
+
+    pruned_map = prune_derivable_entries(katakana_map)
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(pruned_map, f, ensure_ascii=False, indent=4)
+
+    print(
+        f"Pruned {len(katakana_map) - len(pruned_map)} derivable entries "
+        f"({len(katakana_map)} → {len(pruned_map)}). Saved to {output_file}"
+    )
+
+
+if __name__ == "__main__":
+    main()
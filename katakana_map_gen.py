@@ -2,297 +2,469 @@
 Install the Google AI Python SDK
 
 $ pip install google-generativeai
+
+$ GEMINI_API_KEY=... python katakana_map_gen.py [--concurrency 8] [--rpm 1000] [--tpm 4000000]
+
+--backend fake を指定すると、Gemini API の代わりにネットワークに接続しない FakeBackend を使う。
+--fake-latency / --fake-error-rate / --fake-missing-rate で遅延とエラーの発生率を指定できる。
+
+Gemini API のレスポンスは .response_cache/ にキャッシュされ、同じリクエストはモデルを呼び出さずに再実行できる。
+キャッシュの場所と上限サイズは --cache-dir / --cache-size-mb で指定でき、--no-cache で無効にできる。
+
+生成したエントリーは katakana_map.journal.jsonl に追記し、全ての処理が完了した時点で katakana_map.json にまとめる。
+中断した場合は、同じコマンドを再実行するとジャーナルに記録済みの単語を飛ばして再開する。
+ジャーナルの内容を katakana_map.json にまとめるだけの場合は --compact を指定する。
+
+読みが欠けていたりカタカナ以外の文字を含んでいたりした単語は、リトライプールに戻し、
+その回のリクエストが全て完了した後に、失敗した単語だけを改めてチャンクに分けて再送する。
+チャンクの分け方は単語のリストのみから決まるため、同じコマンドを再実行するとレスポンスキャッシュから応答できる。
+MAX_WORD_ATTEMPTS 回生成に失敗した単語は katakana_map.quarantine.jsonl に記録し、以降の実行では処理対象から除外する。
+リトライの上限に達したリクエストの単語は、単語自体に問題があるわけではないため試行回数に数えずにリトライプールへ戻す。
+MAX_CONSECUTIVE_GIVE_UPS 回続けてリクエストがリトライの上限に達した場合は、API の障害とみなして実行を中断する。
+隔離した単語も処理し直す場合は --retry-quarantined を指定する。
+
+data.py や katakana_map_jawiki.json など、katakana_map_cleaner.py でのマージ時に katakana_map.json の値を必ず上書きする
+ソースに含まれる単語は、生成しても捨てられるため処理対象から除外する (--no-prefilter で無効にできる)。
+
+--frequency-file に「単語 出現回数」形式の頻度ファイルを指定すると、出現回数の多い単語から順に処理する。
+--limit と組み合わせると、限られた時間や予算で実際のテキストでのヒット率を最大化できる。
+処理済みの単語はジャーナルから復元されるため、再実行すると残りの単語のうち出現回数の多いものから再開する。
+
+リクエストごとのレイテンシーやトークン数、採用・不採用の単語数は katakana_map.metrics.jsonl に記録される。
+python katakana_map_metrics.py でスループットと採用 1,000 エントリーあたりの推定コストを集計できる。
 """
 
-import csv
-import io
+import argparse
+import asyncio
 import json
-import os
 import time
 import traceback
-import unicodedata
+from collections import Counter, deque
 from pathlib import Path
 
-import google.generativeai as genai
-from google.generativeai.types import HarmBlockThreshold, HarmCategory
-
-
-genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-
-# Create the model
-generation_config = {
-    "temperature": 1,
-    "top_p": 0.95,
-    "top_k": 64,
-    "max_output_tokens": 8192,
-    "response_mime_type": "text/plain",
-}
-
-model = genai.GenerativeModel(
-    model_name="gemini-1.5-flash-exp-0827",
-    generation_config=generation_config,
-    safety_settings={
-        # 制限を全部解除
-        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-    },
-    # See https://ai.google.dev/gemini-api/docs/safety-settings
-    system_instruction="""あなたは英単語をカタカナ英語に変換する専門家です。以下の厳密なルールに従って変換を行ってください：
-
-1. 入力: 改行区切りの英単語リストが与えられます。
-2. 出力: 各単語をカタカナ英語に変換し、CSV形式で返してください。
-
-変換ルール:
-- 全ての入力単語を必ず変換すること。
-- 単語数は必ず入力と出力で一致させること。例えば入力が100単語あれば出力も100単語でなければならない。このルールは絶対である。
-- ミススペルや不自然な単語でも必ず変換すること。
-- 日本で一般的に使用されるカタカナ英語を優先すること。例: "orange" → "オレンジ"
-- 固有名詞も可能な限り一般的な読み方で変換すること。
-- 略語やアクロニムは一般的な読み方で変換すること。例: "NASA" → "ナサ"
-- 変換結果は必ずカタカナのみで構成すること。アルファベットや平仮名を含めないこと。
-- 日本語への翻訳は行わないこと。例: "apple" → "アップル"（"りんご"ではない）
-- "chugoku" のような日本語と思われるローマ字であっても、必ずカタカナ英語で変換すること。 例: "chugoku" → "チュウゴク"
-- "directv" のような英語の固有名詞であっても、必ずアルファベットを用いず発音のカタカナ英語で変換すること。 例: "directv" → "ディレクティービー"
-- "extrasensory" のような複雑な英語の名詞であっても、必ずアルファベットを用いず発音のカタカナ英語で変換すること。 例: "extrasensory" → "エクストラセンソリー"
-- "fenech" のようなマイナーな人名であっても、必ずアルファベットを用いず発音のカタカナ英語で変換すること。 例: "fenech" → "フェネッチ"
-- "honduran" のような国名や国の人々の名前であっても、"ホンジュラス人" とはせず、必ずカタカナ英語で変換すること。 例: "honduran" → "ホンジュラン", "kuwaiti" → "クウェーティ", "palestinian" → "パレスティニアン"
-- 長音符（ー）を適切に使用すること。例: "computer" → "コンピューター"
-- 促音や拗音を正確に表現すること。例: "application" → "アプリケーション"
-- 複数形はちゃんと s をカタカナで表現すること。例: "apples" → "アップルズ"
-
-出力フォーマット:
-apple,アップル
-banana,バナナ
-cherry,チェリー
-donut,ドーナツ
-...
-
-この任務は極めて重要です。一つでも間違いや抜け漏れがあると深刻な問題につながります。細心の注意を払って作業してください。""",
+from katakana_map_backend import FakeBackend, GeminiBackend, GenerationBackend
+from katakana_map_backend import GENERATION_CONFIG
+from katakana_map_journal import Journal, compact, journal_path_for, load_quarantined, quarantine_path_for, replay
+from katakana_map_metrics import MetricsLog, metrics_path_for
+from katakana_map_packer import RequestPacker
+from katakana_map_ratelimit import (
+    BACKOFF_POLICIES,
+    MalformedResponseError,
+    RateLimiter,
+    backoff_delay,
+    classify_error,
+    estimate_tokens,
 )
-
-
-# send_message() すると不要な履歴がどんどん積もっていくため、都度新しいセッションを作成する
-def get_chat_session():
-    chat_session = model.start_chat(
-        history=[
-            {
-                "role": "user",
-                "parts": [
-                    """
-                    aaa
-                    aaberg
-                    aachen
-                    aachener
-                    aaker
-                    aalborg
-                    aalburg
-                    aalen
-                    aaliyah
-                    aalseth
-                    alpern
-                    fenech
-                    judo
-                    jujitsu
-                    kuwaiti
-                    mombasa
-                    naacp
-                    norinko
-                    plimpton
-                    """.strip(),
-                ],
-            },
-            {
-                "role": "model",
-                "parts": [
-                    """
-                    aaa,トリプルエー
-                    aaberg,アーバーグ
-                    aachen,アーヘン
-                    aachener,アーヘナー
-                    aaker,アーカー
-                    aalborg,オールボー
-                    aalburg,アールブルフ
-                    aalen,アーレン
-                    aaliyah,アリーヤ
-                    aalseth,オルセス
-                    alpern,アルペルン
-                    fenech,フェネック
-                    judo,ジュウドー
-                    jujitsu,ジュジツ
-                    kuwaiti,クウェーティ
-                    mombasa,モンバサ
-                    naacp,エヌエーエーシーピー
-                    norinko,ノリンコ
-                    plimpton,プリンプトン
-                    """.strip(),
-                ],
-            },
-        ]
-    )
-    return chat_session
+from katakana_map_response_cache import ResponseCache
+from katakana_map_sources import load_overriding_keys, load_word_frequencies
+from katakana_map_validator import is_katakana, normalize_katakana
 
 
 current_dir = Path(__file__).parent
 
-# cmudict_words.txtからの単語読み込み
-with open(current_dir / "cmudict_words.txt", "r") as f:
-    words = f.read().splitlines()
+# 同時に送信するリクエスト数の既定値
+DEFAULT_CONCURRENCY = 8
 
-# 既存のkatakana_map.jsonの読み込み
-katakana_map = {}
-with open(current_dir / "katakana_map.json", "r") as f:
-    katakana_map = json.load(f)
+# 1 分あたりのリクエスト数とトークン数の上限の既定値
+DEFAULT_REQUESTS_PER_MINUTE = 1000
+DEFAULT_TOKENS_PER_MINUTE = 4_000_000
 
-# 500 単語ずつ処理
-total_words = len(words)
-SIMUL_WORD_COUNT = 500
+# システムプロンプトと few-shot の履歴のおおよそのトークン数
+PROMPT_TOKENS = 2000
 
+# レスポンスの末尾からこの数以上の単語が連続して欠けていた場合は、出力が打ち切られたとみなす
+TRUNCATION_MIN_MISSING_WORDS = 2
 
-def normalize_katakana(text):
-    text = unicodedata.normalize("NFKC", text)  # 正規化
-    text = text.replace("\u3099", "")  # 結合文字の濁点を削除、る゙ → る
-    text = text.replace("\u309A", "")  # 結合文字の半濁点を削除、な゚ → な
-    return text
+# 1 つの単語を生成し直す回数の上限 (これを超えた単語は隔離ファイルに記録して諦める)
+MAX_WORD_ATTEMPTS = 3
 
+# 試行回数に数える、単語自体の問題による失敗の理由
+# (出力の打ち切りやリクエスト全体のエラーで欠けた単語は、他の単語と一緒に送り直せば生成できる可能性がある)
+WORD_FAILURE_REASONS = ("non_katakana", "missing")
 
-def is_katakana(text):
-    text = normalize_katakana(text)
-    return all(
-        (
-            unicodedata.category(char) in ["Lo", "Lm", "Sk", "Mn", "Pd"]
-            and unicodedata.name(char).startswith(("KATAKANA", "HALFWIDTH KATAKANA"))
-        )
-        or char == "ー"  # 伸ばす棒はカタカナ以外でも OK
-        or char == "・"  # 中点はカタカナ以外でも OK
-        for char in text
-    )
+# 成功したリクエストを挟まずに、この回数続けてリクエストがリトライの上限に達した場合は実行を中断する
+MAX_CONSECUTIVE_GIVE_UPS = 3
 
 
-for i in range(0, total_words, SIMUL_WORD_COUNT):
-    chunk = words[i : i + SIMUL_WORD_COUNT]
-    input_text = "\n".join(chunk)
+def load_katakana_map(path: Path) -> dict[str, str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-    # 既存のkatakana_map.jsonを再読み込み
-    with open(current_dir / "katakana_map.json", "r") as f:
-        katakana_map = json.load(f)
 
-    # 既に処理済みの単語をスキップ
-    chunk = [word for word in chunk if word not in katakana_map]
-    if not chunk:
-        print(
-            f"Skipping words {i+1} to {min(i+SIMUL_WORD_COUNT, total_words)} as they are already processed."
-        )
-        continue
+def validate_entries(current_entries: dict[str, str], chunk: list[str]) -> tuple[dict[str, str], dict[str, str], set[str]]:
+    """
+    バックエンドが生成したエントリーを検証する
 
-    input_text = "\n".join(chunk)
-    new_entries = {}
+    問題のない単語とその読み、再処理すべき単語とその理由 ("non_katakana" または "missing")、余分な単語を返す。
+    """
+    chunk_words = set(chunk)
+    failed_words: dict[str, str] = {}
+    # カタカナ以外の文字が含まれている単語を特定
+    for word, value in current_entries.items():
+        if word in chunk_words and not is_katakana(value):
+            failed_words[word] = "non_katakana"
+    # 不足している単語を特定
+    for word in chunk:
+        if word not in current_entries:
+            failed_words[word] = "missing"
+    # 余分な単語を特定
+    extra_words = set(current_entries) - chunk_words
 
-    max_retries = 30
-    retry_delay = 5  # seconds
+    # 問題のない単語
+    valid_entries = {
+        word: value for word, value in current_entries.items() if word in chunk_words and is_katakana(value)
+    }
+    return valid_entries, failed_words, extra_words
 
-    while chunk:
-        retry_count = 0
-        while retry_count < max_retries:
-            try:
-                print(
-                    f"Processing words {i+1} to {min(i+SIMUL_WORD_COUNT, total_words)} out of {total_words}. (chunk: {len(chunk)})"
-                )
-                # ダミー単語を追加
-                # 処理対象の単語リストに含まれないダミーワードを追加
-                dummy_words = ['apple', 'banana', 'cherry', 'date', 'watermelon']
-                dummy_words = [word for word in dummy_words if word not in chunk]
-                input_text_with_dummy = "\n".join(chunk + dummy_words)
-                response = get_chat_session().send_message(input_text_with_dummy)
-
-                # レスポンスの解析
-                csv_reader = csv.reader(io.StringIO(response.text))
-                current_entries = {
-                    row[0]: row[1].replace(' ', '') for row in csv_reader if len(row) == 2
-                }
-
-                # ダミー単語を除去
-                for dummy in dummy_words:
-                    current_entries.pop(dummy, None)
-
-                # カタカナ以外の文字が含まれている単語を特定
-                non_katakana_words = {
-                    word: value
-                    for word, value in current_entries.items()
-                    if not is_katakana(value)
-                }
-
-                # 不足している単語を特定
-                missing_words = set(chunk) - set(current_entries.keys())
-
-                # 余分な単語を特定
-                extra_words = set(current_entries.keys()) - set(chunk)
-
-                # 問題のない単語を new_entries に追加
-                valid_entries = {
-                    word: value
-                    for word, value in current_entries.items()
-                    if word in chunk and is_katakana(value)
-                }
-                new_entries.update(valid_entries)
-
-                # 問題のある単語のみを次のイテレーションで処理
-                chunk = list(non_katakana_words.keys()) + list(missing_words)
-
-                if extra_words:
-                    print(f'Extra words: {", ".join(extra_words)}')
-                    print(f"Number of extra words: {len(extra_words)}")
-
-                if not chunk:
-                    break  # 全ての単語が正しく処理された場合
 
-                print(
-                    f'Retrying {len(chunk)} problematic words {", ".join(chunk)} (katakana: {", ".join(non_katakana_words.values())}, missing: {", ".join(missing_words)}) in {retry_delay} seconds...'
-                )
-                time.sleep(retry_delay)
-                break  # 成功したらwhile retry_count ループを抜ける
+def estimate_request_tokens(chunk: list[str], packer: RequestPacker) -> int:
+    """リクエストで消費される入力と出力の合計のおおよそのトークン数を返す"""
+    output_tokens = sum(packer.estimate_output_tokens(word) for word in chunk)
+    return PROMPT_TOKENS + estimate_tokens("\n".join(chunk)) + int(output_tokens)
 
-            except Exception as e:
-                retry_count += 1
-                print(f"Error processing words: {str(e)}")
-                print("Stacktrace:")
-                traceback.print_exc()
-                if retry_count < max_retries:
-                    print(
-                        f"Retrying in {retry_delay} seconds... (Attempt {retry_count + 1} of {max_retries})"
-                    )
-                    time.sleep(retry_delay)
-                else:
-                    print(
-                        f'Max retries reached. Skipping problematic words: {", ".join(chunk)}'
-                    )
-                    chunk = []  # 最大リトライ回数に達した場合、問題のある単語をスキップ
 
-        if retry_count == max_retries:
-            print("Moving to the next chunk due to persistent errors.")
+def is_truncated(result: dict[str, str], chunk: list[str]) -> bool:
+    """レスポンスの末尾の単語が連続して欠けているかどうかから、出力が打ち切られたかどうかを推定する"""
+    missing_tail = 0
+    for word in reversed(chunk):
+        if word in result:
+            break
+        missing_tail += 1
+    return missing_tail >= TRUNCATION_MIN_MISSING_WORDS
+
+
+async def generate_chunk(
+    chunk: list[str],
+    label: str,
+    backend: GenerationBackend,
+    limiter: RateLimiter,
+    packer: RequestPacker,
+    metrics: MetricsLog,
+) -> tuple[dict[str, str], dict[str, str]]:
+    """
+    1 チャンク分の単語の読みを生成する
+
+    リクエストがエラーになった場合は、リトライ回数がエラーの種類ごとの上限に達するまで同じチャンクを再送する。
+    生成できた単語とその読み、生成できなかった単語とその理由を返す。生成できなかった単語の再処理は呼び出し側で行う。
+    出力が打ち切られた場合、欠けていた単語の理由は "truncated" とする。
+    リクエストの送信前には、全てのワーカーで共有する limiter からリクエスト数とトークン数の枠を取得する。
+    ただし、バックエンドがキャッシュから応答できる場合は枠を取得せずに応答を使う。
+    リクエストのトークン数は、packer の出力トークン数の見積もりに基づいて見積もる。
+    各リクエストの結果は、エラーになったものも含めて metrics に記録する。
+    """
+    # エラーの種類ごとのリトライ回数
+    attempts: Counter[str] = Counter()
+    while True:
+        result = None
+        failed_words: dict[str, str] = {}
+        # リクエストを送信する前にエラーになった場合は、レイテンシーを記録しない
+        started_at = None
+        try:
+            print(f"Processing {label}.")
+            estimated_tokens = estimate_request_tokens(chunk, packer)
+            # キャッシュから応答できる場合はモデルを呼び出さないため、レートリミッターの枠も取得しない
+            replay_started_at = time.monotonic()
+            result = backend.replay(chunk)
+            if result is not None:
+                latency = time.monotonic() - replay_started_at
+            else:
+                await limiter.acquire(estimated_tokens)
+                # レイテンシーにはレートリミッターでの待ち時間を含めない
+                started_at = time.monotonic()
+                result = await backend.generate(chunk)
+                latency = time.monotonic() - started_at
+                if result.total_tokens is not None:
+                    limiter.record_usage(estimated_tokens, result.total_tokens)
+            truncated = result.truncated or is_truncated(result, chunk)
+            if truncated:
+                limiter.counters["truncated"] += 1
+            valid_entries, failed_words, extra_words = validate_entries(result, chunk)
+            if truncated:
+                # 出力の打ち切りで欠けた単語は、単語自体に問題があるわけではない
+                failed_words = {word: "truncated" if reason == "missing" else reason for word, reason in failed_words.items()}
+            if not valid_entries:
+                raise MalformedResponseError("No valid entries found in the response")
+            reasons = Counter(failed_words.values())
+            metrics.record(
+                request=label,
+                words=len(chunk),
+                latency=latency,
+                error=None,
+                accepted=len(valid_entries),
+                non_katakana=reasons["non_katakana"],
+                missing=reasons["missing"],
+                truncated=reasons["truncated"],
+                extra=len(extra_words),
+                cached=result.cached,
+                input_tokens=result.input_tokens,
+                output_tokens=result.output_tokens,
+            )
             break
+        except Exception as e:
+            kind = classify_error(e)
+            metrics.record(
+                request=label,
+                words=len(chunk),
+                latency=None if started_at is None else time.monotonic() - started_at,
+                error=kind,
+                cached=getattr(result, "cached", False),
+                input_tokens=getattr(result, "input_tokens", None),
+                output_tokens=getattr(result, "output_tokens", None),
+            )
+            attempts[kind] += 1
+            print(f"Error processing {label} ({kind}): {str(e)}")
+            if kind == "transient":
+                print("Stacktrace:")
+                traceback.print_exc()
+            max_retries = BACKOFF_POLICIES[kind].max_retries
+            if attempts[kind] > max_retries:
+                limiter.record_give_up(kind)
+                print(f"Max retries reached. Returning {len(chunk)} words of {label} to the retry pool.")
+                if failed_words:
+                    # レスポンスは解析できたが有効な読みが 1 つもなかった場合は、単語ごとの理由を返して試行回数に数える
+                    # (1 語も出力されないのは打ち切りではないため、末尾が欠けていても "missing" とする)
+                    return {}, {word: "missing" if reason == "truncated" else reason for word, reason in failed_words.items()}
+                return {}, {word: kind for word in chunk}
+            limiter.record_retry(kind)
+            delay = backoff_delay(kind, attempts[kind])
+            if kind == "quota":
+                # クォータ超過は全てのワーカーに共通する問題のため、全体の送信を止める
+                limiter.pause(delay)
+            print(f"Retrying {label} in {delay:.1f} seconds... (Attempt {attempts[kind]} of {max_retries})")
+            await asyncio.sleep(delay)
+
+    if extra_words:
+        print(f'Extra words in {label}: {", ".join(extra_words)}')
+        print(f"Number of extra words: {len(extra_words)}")
 
     # 念のためカタカナ語に対し正規化を実行
-    sorted_entries = {
-        key: normalize_katakana(value) for key, value in new_entries.items()
-    }
-
-    # katakana_map.jsonの更新
-    katakana_map.update(sorted_entries)
-    print(
-        f"Added {len(sorted_entries)} new entries to katakana_map. Total entries: {len(katakana_map)}"
-    )
-
-    # アルファベット順にソート（キーのみ）
-    katakana_map = dict(sorted(katakana_map.items(), key=lambda x: x[0].lower()))
-
-    # 途中経過の保存
-    with open(current_dir / "katakana_map.json", "w", encoding="utf-8") as f:
-        json.dump(katakana_map, f, ensure_ascii=False, indent=4)
+    return {key: normalize_katakana(value) for key, value in valid_entries.items()}, failed_words
+
+
+async def generate_all(
+    words: list[str],
+    katakana_map_path: Path,
+    backend: GenerationBackend,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    limiter: RateLimiter | None = None,
+    packer: RequestPacker | None = None,
+    retry_quarantined: bool = False,
+    overriding_keys: set[str] | None = None,
+    frequencies: dict[str, int] | None = None,
+    limit: int | None = None,
+    metrics: MetricsLog | None = None,
+) -> dict[str, str]:
+    """
+    未処理の単語の読みを、concurrency 個のワーカーで並行してリクエストを送信しながら生成する
+
+    処理対象の単語は、最初に packer で全てのチャンクに分けておき、各ワーカーはその先頭から取り出してリクエストを送信する。
+    チャンクの分け方は単語のリストと packer の設定のみから決まるため、同じ単語のリストで再実行すると
+    同じリクエストが送られ、レスポンスキャッシュから応答できる。
+    中断後の再開時は、前回の実行と同じ分け方をした上で、処理済みの単語を含まないチャンクはそのまま送り、
+    一部の単語のみ残ったチャンクの残りは、まとめてチャンクに分け直す。
+    生成できなかった単語はリトライプールに戻し、その回のチャンクが全て完了した時点で、
+    処理対象の単語の順に並べて次の回のチャンクに分ける (完了した順序によって分け方が変わらないよう、回の間は並行に送信しない)。
+    各リクエストの結果は完了した順にジャーナルへ追記し、全ての単語を処理した時点で katakana_map_path にまとめる。
+    前回中断した時点までにジャーナルに記録されたエントリーと、隔離ファイルに記録された単語は処理済みとして扱う。
+    overriding_keys に含まれる単語は、マージ時に他のソースの値で上書きされるため処理しない。
+    frequencies を指定した場合は出現回数の多い単語から順に処理し、limit を指定した場合は最大 limit 個の単語のみ処理する。
+    """
+    journal_path = journal_path_for(katakana_map_path)
+    quarantine_path = quarantine_path_for(katakana_map_path)
+    katakana_map = load_katakana_map(katakana_map_path) if katakana_map_path.exists() else {}
+    replay(journal_path, katakana_map)
+    quarantined = set() if retry_quarantined else load_quarantined(quarantine_path)
+    if limiter is None:
+        limiter = RateLimiter(DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE)
+    if packer is None:
+        packer = RequestPacker(GENERATION_CONFIG["max_output_tokens"])
+    if metrics is None:
+        metrics = MetricsLog(None)
+
+    # 既に処理済みの単語と隔離済みの単語をスキップ
+    unique_words = list(dict.fromkeys(words))
+    processed = [word for word in unique_words if word in katakana_map or word in quarantined]
+    print(f"Skipping {len(processed)} words as they are already processed or quarantined.")
+    # マージ時に他のソースの値で上書きされる単語をスキップ
+    if overriding_keys:
+        candidates = [word for word in unique_words if word not in overriding_keys]
+        print(f"Skipping {len(unique_words) - len(candidates)} words as they are overridden by other sources.")
+    else:
+        candidates = unique_words
+    if frequencies:
+        # 出現回数が同じ単語は元の順序 (アルファベット順) を維持する
+        candidates.sort(key=lambda word: -frequencies.get(word, 0))
+    # 処理済みの単語の有無によらずチャンクの分け方が変わらないよう、処理済みの単語も含めて分けてから除外する
+    fresh_chunks = []
+    leftover_words = []
+    for chunk in packer.plan(candidates):
+        unprocessed = [word for word in chunk if word not in katakana_map and word not in quarantined]
+        if len(unprocessed) == len(chunk):
+            fresh_chunks.append(chunk)
+        else:
+            leftover_words.extend(unprocessed)
+    pending = deque(packer.plan(leftover_words) + fresh_chunks)
+    total_words = sum(len(chunk) for chunk in pending)
+    if limit is not None and total_words > limit:
+        print(f"Processing the first {limit} of {total_words} words in this run.")
+        limited: deque[list[str]] = deque()
+        while pending and limit > 0:
+            chunk = pending.popleft()[:limit]
+            limited.append(chunk)
+            limit -= len(chunk)
+        pending = limited
+        total_words = sum(len(chunk) for chunk in pending)
+    # リトライプールの単語を次の回のチャンクに分けるときの並び順
+    positions = {word: position for position, word in enumerate(candidates)}
+    retry_pool: list[str] = []
+    retry_round = 0
+    word_attempts: Counter[str] = Counter()
+    request_count = 0
+    # 送信中のリクエスト数。リトライプールが空でも、送信中のリクエストが失敗した単語を戻す可能性がある間はワーカーを終了しない
+    in_flight = 0
+    consecutive_give_ups = 0
+    stopped = False
+    condition = asyncio.Condition()
+
+    def has_work() -> bool:
+        # リトライプールの単語は、その回の送信中のリクエストが全て完了してからチャンクに分ける
+        return not stopped and bool(pending or (retry_pool and in_flight == 0))
+
+    def remaining_words() -> int:
+        return sum(len(chunk) for chunk in pending) + len(retry_pool)
+
+    async def worker(journal: Journal, quarantine: Journal) -> None:
+        nonlocal request_count, in_flight, consecutive_give_ups, stopped, retry_round
+        while True:
+            async with condition:
+                await condition.wait_for(lambda: has_work() or stopped or in_flight == 0)
+                if not has_work():
+                    return
+                if not pending:
+                    # この回のリクエストが全て完了したため、リトライプールの単語を次の回のチャンクに分ける
+                    retry_round += 1
+                    pending.extend(packer.plan(sorted(retry_pool, key=positions.__getitem__), retry_round))
+                    retry_pool.clear()
+                chunk = pending.popleft()
+                in_flight += 1
+            try:
+                request_count += 1
+                label = f"request #{request_count} ({len(chunk)} words)"
+                new_entries, failed_words = await generate_chunk(chunk, label, backend, limiter, packer, metrics)
+                katakana_map.update(new_entries)
+                # 途中経過の保存
+                journal.append(new_entries)
+
+                if any(reason in (*WORD_FAILURE_REASONS, "truncated") for reason in failed_words.values()) or new_entries:
+                    consecutive_give_ups = 0
+                else:
+                    # リクエスト全体がエラーのままリトライの上限に達した
+                    consecutive_give_ups += 1
+                    if consecutive_give_ups >= MAX_CONSECUTIVE_GIVE_UPS and not stopped:
+                        stopped = True
+                        print(
+                            f"{consecutive_give_ups} requests in a row gave up. Stopping this run; "
+                            "run the same command again to resume."
+                        )
+
+                quarantined_records = []
+                for word, reason in failed_words.items():
+                    # 単語自体の問題による失敗のみを試行回数に数え、それ以外は数えずにリトライプールへ戻す
+                    if reason in WORD_FAILURE_REASONS:
+                        word_attempts[word] += 1
+                    if word_attempts[word] >= MAX_WORD_ATTEMPTS:
+                        quarantined_records.append({"word": word, "reason": reason, "attempts": word_attempts[word]})
+                    else:
+                        retry_pool.append(word)
+                quarantine.write_records(quarantined_records)
+                limiter.counters["pooled_words"] += len(failed_words) - len(quarantined_records)
+                limiter.counters["quarantined_words"] += len(quarantined_records)
+
+                remaining = remaining_words()
+                print(
+                    f"Added {len(new_entries)} new entries to katakana_map. Total entries: {len(katakana_map)} "
+                    f"({(total_words - remaining) / total_words * 100:.2f}% completed, {remaining} words remaining, "
+                    f"{len(retry_pool)} in the retry pool)"
+                )
+                if quarantined_records:
+                    print(f'Quarantined {len(quarantined_records)} words: {", ".join(r["word"] for r in quarantined_records)}')
+                print(f"Metrics: {metrics.format_progress()}")
+                print(f"Rate limiter: {limiter.format_counters()}")
+            finally:
+                async with condition:
+                    in_flight -= 1
+                    condition.notify_all()
+
+    with Journal(journal_path) as journal, Journal(quarantine_path) as quarantine:
+        await asyncio.gather(*(worker(journal, quarantine) for _ in range(concurrency)))
+
+    if stopped:
+        print(f"{remaining_words()} words were left unprocessed and will be retried in the next run.")
+    return compact(katakana_map_path, journal_path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate katakana readings of cmudict words with Gemini.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="number of requests in flight")
+    parser.add_argument("--max-words", type=int, default=1000, help="maximum number of words per request")
+    parser.add_argument("--rpm", type=float, default=DEFAULT_REQUESTS_PER_MINUTE, help="requests per minute limit")
+    parser.add_argument("--tpm", type=float, default=DEFAULT_TOKENS_PER_MINUTE, help="tokens per minute limit")
+    parser.add_argument("--compact", action="store_true", help="only fold the journal into katakana_map.json")
+    parser.add_argument("--retry-quarantined", action="store_true", help="process quarantined words again")
+    parser.add_argument("--no-prefilter", action="store_true", help="also process words overridden by other sources")
+    parser.add_argument("--frequency-file", type=Path, help='"word count" file to process frequent words first')
+    parser.add_argument("--limit", type=int, help="maximum number of words to process in this run")
+    parser.add_argument("--backend", choices=["gemini", "fake"], default="gemini", help="generation backend")
+    parser.add_argument("--fake-latency", type=float, default=0.5, help="mean latency of the fake backend in seconds")
+    parser.add_argument("--fake-error-rate", type=float, default=0.0, help="error rate of each error class of the fake backend")
+    parser.add_argument("--fake-missing-rate", type=float, default=0.0, help="rate of words dropped by the fake backend")
+    parser.add_argument("--cache-dir", type=Path, default=current_dir / ".response_cache", help="response cache directory")
+    parser.add_argument("--cache-size-mb", type=float, default=512, help="maximum size of the response cache")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    args = parser.parse_args()
+
+    if args.compact:
+        katakana_map = compact(current_dir / "katakana_map.json")
+        print(f"Compacted the journal into katakana_map.json. Total entries: {len(katakana_map)}")
+        return
+
+    # cmudict_words.txtからの単語読み込み
+    with open(current_dir / "cmudict_words.txt", "r") as f:
+        words = f.read().splitlines()
+
+    if args.backend == "fake":
+        backend = FakeBackend(
+            latency=args.fake_latency,
+            error_rates={kind: args.fake_error_rate for kind in BACKOFF_POLICIES},
+            missing_rate=args.fake_missing_rate,
+        )
+    else:
+        cache = None if args.no_cache else ResponseCache(args.cache_dir, int(args.cache_size_mb * 1024 * 1024))
+        backend = GeminiBackend(cache=cache)
+
+    limiter = RateLimiter(args.rpm, args.tpm)
+    packer = RequestPacker(GENERATION_CONFIG["max_output_tokens"], max_words=args.max_words)
+    metrics = MetricsLog(metrics_path_for(current_dir / "katakana_map.json"))
+    with metrics:
+        asyncio.run(
+            generate_all(
+                words,
+                current_dir / "katakana_map.json",
+                backend,
+                args.concurrency,
+                limiter,
+                packer,
+                retry_quarantined=args.retry_quarantined,
+                overriding_keys=None if args.no_prefilter else load_overriding_keys(current_dir),
+                frequencies=load_word_frequencies(args.frequency_file) if args.frequency_file else None,
+                limit=args.limit,
+                metrics=metrics,
+            )
+        )
+    print("Processing complete. Results saved to katakana_map.json")
+    if isinstance(backend, GeminiBackend) and backend.cache is not None:
+        print(f"Response cache: {backend.cache.format_stats()}")
 
-    print(
-        f"Response generated successfully. {total_words - (i+SIMUL_WORD_COUNT)} words remaining ({(i+SIMUL_WORD_COUNT)/total_words*100:.2f}% completed)"
-    )
 
-print("Processing complete. Results saved to katakana_map.json")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+katakana_map_gen.py で生成したエントリーを記録する追記専用のジャーナル (JSONL) を扱うモジュール
+
+生成したエントリーはチャンクごとにジャーナルの末尾へ ["単語", "カタカナ"] の形式で 1 行ずつ追記し、fsync する。
+katakana_map.json 全体の書き直しは compact() で行い、ジャーナルの内容をソート済みの JSON にまとめた後にジャーナルを空にする。
+中断後に再開する場合は、katakana_map.json にジャーナルを replay() した結果を処理済みのエントリーとして扱う。
+
+繰り返し生成に失敗した単語は、同じ形式の追記専用ファイル (katakana_map.quarantine.jsonl) に
+{"word": 単語, "reason": 失敗の理由, "attempts": 試行回数} の形式で記録し、以降の実行では処理対象から除外する。
+
+$ python katakana_map_journal.py [katakana_map.json] [katakana_map.journal.jsonl]
+"""
+
+import json
+import os
+import sys
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import TextIO
+
+
+def journal_path_for(katakana_map_path: Path) -> Path:
+    """katakana_map.json に対応するジャーナルのパス (katakana_map.journal.jsonl) を返す"""
+    return katakana_map_path.with_suffix(".journal.jsonl")
+
+
+def quarantine_path_for(katakana_map_path: Path) -> Path:
+    """katakana_map.json に対応する隔離ファイルのパス (katakana_map.quarantine.jsonl) を返す"""
+    return katakana_map_path.with_suffix(".quarantine.jsonl")
+
+
+def iter_records(path: Path) -> Iterator:
+    """JSONL ファイルに記録されたレコードを記録順に返す"""
+    if not path.exists():
+        return
+    # 書き込み中に中断された最後の行は、マルチバイト文字の途中で途切れている可能性がある
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # 書き込み中に中断された最後の行は読み飛ばす
+                continue
+
+
+def iter_journal(path: Path) -> Iterator[tuple[str, str]]:
+    """ジャーナルに記録された (単語, カタカナ) を記録順に返す"""
+    for key, value in iter_records(path):
+        yield key, value
+
+
+def load_quarantined(path: Path) -> set[str]:
+    """隔離ファイルに記録された単語の集合を返す"""
+    return {record["word"] for record in iter_records(path)}
+
+
+def replay(path: Path, katakana_map: dict[str, str] | None = None) -> dict[str, str]:
+    """ジャーナルの内容を katakana_map (省略時は空の dict) に記録順に反映して返す"""
+    if katakana_map is None:
+        katakana_map = {}
+    katakana_map.update(iter_journal(path))
+    return katakana_map
+
+
+def save_sorted(katakana_map: dict[str, str], path: Path) -> None:
+    """キーの小文字でソートした katakana_map を、書き込み途中のファイルが残らないよう一時ファイル経由で保存する"""
+    katakana_map = dict(sorted(katakana_map.items(), key=lambda x: x[0].lower()))
+    temporary_path = path.with_name(path.name + ".tmp")
+    with open(temporary_path, "w", encoding="utf-8") as f:
+        json.dump(katakana_map, f, ensure_ascii=False, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+
+def compact(katakana_map_path: Path, journal_path: Path | None = None) -> dict[str, str]:
+    """ジャーナルの内容を katakana_map.json にまとめて保存し、ジャーナルを空にする"""
+    if journal_path is None:
+        journal_path = journal_path_for(katakana_map_path)
+    katakana_map: dict[str, str] = {}
+    if katakana_map_path.exists():
+        with open(katakana_map_path, "r", encoding="utf-8") as f:
+            katakana_map = json.load(f)
+    replay(journal_path, katakana_map)
+    save_sorted(katakana_map, katakana_map_path)
+    # katakana_map.json の保存が完了してからジャーナルを空にするため、途中で中断してもエントリーは失われない
+    journal_path.unlink(missing_ok=True)
+    return katakana_map
+
+
+class Journal:
+    """エントリーをジャーナル (または隔離ファイル) に追記するクラス"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        # 何も記録しない実行で空のファイルを作らないよう、最初に追記する時点で開く
+        self.file: TextIO | None = None
+
+    def get_file(self) -> TextIO:
+        if self.file is None:
+            # 前回書き込み中に中断された行が残っている場合は、次の行と繋がらないよう改行を補う
+            needs_newline = False
+            if self.path.exists() and self.path.stat().st_size > 0:
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) != b"\n"
+            self.file = open(self.path, "a", encoding="utf-8")
+            if needs_newline:
+                self.file.write("\n")
+        return self.file
+
+    def append(self, entries: dict[str, str]) -> None:
+        """エントリーをまとめて追記し、ディスクへの書き込みが完了するまで待つ"""
+        self.write_records([key, value] for key, value in entries.items())
+
+    def write_records(self, records: Iterable) -> None:
+        """レコードを 1 行ずつまとめて追記し、ディスクへの書き込みが完了するまで待つ"""
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        if not data:
+            return
+        file = self.get_file()
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def main() -> None:
+    current_dir = Path(__file__).parent
+    katakana_map_path = Path(sys.argv[1]) if len(sys.argv) > 1 else current_dir / "katakana_map.json"
+    journal_path = Path(sys.argv[2]) if len(sys.argv) > 2 else journal_path_for(katakana_map_path)
+
+    katakana_map = compact(katakana_map_path, journal_path)
+    print(f"Compacted {journal_path} into {katakana_map_path}. Total entries: {len(katakana_map)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+カタカナ辞書のエントリーを、登録されたルールで 1 回の走査で検証するモジュール
+
+各ルールは、1 つのエントリー (キー, 値) を受け取って問題があれば True を返す小さな関数として @rule で登録する。
+lint() はソースのエントリーを 1 度だけ走査し、エントリーごとにそのソースを対象とする全てのルールを呼び出す。
+そのため、ルールを追加してもソース全体の走査が増えることはない。
+
+検出結果 (Finding) は、ルールの ID・キー・値・ソースの名前を持ち、テキスト・JSON・JSONL の形式で出力できる。
+JSON / JSONL の出力はソースとエントリーの順に並ぶため、CI などで前回の結果と差分を取れる。
+
+jobs に 2 以上を指定すると、エントリーを連続した範囲のシャードに分割して ProcessPoolExecutor で並列に検証する。
+シャードごとの検出結果はシャードの順に連結するため、出力は直列に検証した場合と同じになる。
+
+$ python katakana_map_lint.py [--rules ID ...] [--enable ID ...] [--format text|json|jsonl] [--output PATH] [--jobs N]
+"""
+
+import argparse
+import json
+import math
+import sys
+from collections import Counter
+from collections.abc import Callable, Iterable, Mapping
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+
+from katakana_map_validator import is_katakana
+
+
+# ソースの名前から、そのエントリーへの対応 (ルールがソースをまたいで値を比較するために使う)
+Context = Mapping[str, Mapping[str, str]]
+
+# 並列に検証する場合の 1 シャードあたりの最小エントリー数 (これより小さいと、プロセス間の受け渡しの方が高くつく)
+MIN_SHARD_SIZE = 10_000
+# ワーカーあたりのシャード数 (ルールの処理時間がエントリーによって偏っても、ワーカーの負荷がなるべく均等になるよう細かく分ける)
+SHARDS_PER_WORKER = 4
+
+
+class Rule(NamedTuple):
+    id: str
+    # 問題のあるエントリーが見つかったときの見出し
+    description: str
+    # 問題のあるエントリーが見つからなかったときのメッセージ
+    passed_message: str
+    check: Callable[[str, str, Context], bool]
+    # 既定で検証するソースの名前
+    sources: tuple[str, ...]
+    # False の場合、明示的に有効にしたときのみ使う
+    enabled: bool = True
+    # check が context から参照する、検証対象以外のソースの名前 (並列に検証する場合は、これらのみをワーカーに渡す)
+    context_sources: tuple[str, ...] = ()
+
+
+class Finding(NamedTuple):
+    rule: str
+    key: str
+    value: str
+    source: str
+
+
+RULES: dict[str, Rule] = {}
+
+
+def rule(
+    rule_id: str,
+    description: str,
+    passed_message: str,
+    sources: tuple[str, ...],
+    enabled: bool = True,
+    context_sources: tuple[str, ...] = (),
+) -> Callable[[Callable[[str, str, Context], bool]], Callable[[str, str, Context], bool]]:
+    """検証の関数をルールとして RULES に登録するデコレーター"""
+
+    def register(check: Callable[[str, str, Context], bool]) -> Callable[[str, str, Context], bool]:
+        if rule_id in RULES:
+            raise ValueError(f"Duplicate rule: {rule_id}")
+        RULES[rule_id] = Rule(rule_id, description, passed_message, check, sources, enabled, context_sources)
+        return check
+
+    return register
+
+
+@rule(
+    "non-katakana",
+    "Following keys have non-katakana values:",
+    "All values in KATAKANA_MAP are valid katakana.",
+    sources=("katakana_map", "merged"),
+)
+def check_non_katakana(key: str, value: str, context: Context) -> bool:
+    return not is_katakana(value)
+
+
+@rule(
+    "plural-ending",
+    "Following keys ending with 's' have values not ending with 'ス' or 'ズ' or 'ツ' or 'ヅ':",
+    "All plural words (ending with 's') have correct katakana endings ('ス' or 'ズ' or 'ツ' or 'ヅ').",
+    sources=("katakana_map", "merged"),
+)
+def check_plural_ending(key: str, value: str, context: Context) -> bool:
+    return key.endswith("s") and not value.endswith(("ス", "ズ", "ツ", "ヅ"))
+
+
+# data.py と katakana_map.json で読みが異なるのは珍しくないため、既定では無効にしている
+@rule(
+    "data-mismatch",
+    "Following keys in data.py have values different from katakana_map.json:",
+    "All values in data.py match katakana_map.json.",
+    sources=("data",),
+    enabled=False,
+    context_sources=("katakana_map",),
+)
+def check_data_mismatch(key: str, value: str, context: Context) -> bool:
+    katakana_map = context.get("katakana_map", {})
+    return key in katakana_map and katakana_map[key] != value
+
+
+def select_rules(rule_ids: Iterable[str] | None = None, enable: Iterable[str] = ()) -> list[Rule]:
+    """
+    ID を指定したルールを返す
+
+    rule_ids を省略した場合は、既定で有効なルールと enable に指定したルールを返す。
+    """
+    enable = set(enable)
+    if rule_ids is None:
+        rule_ids = [rule.id for rule in RULES.values() if rule.enabled or rule.id in enable]
+    unknown = [rule_id for rule_id in [*rule_ids, *enable] if rule_id not in RULES]
+    if unknown:
+        raise ValueError(f"Unknown rules: {', '.join(unknown)} (available: {', '.join(RULES)})")
+    return [RULES[rule_id] for rule_id in rule_ids]
+
+
+def check_items(
+    source: str,
+    items: Iterable[tuple[str, str]],
+    rules: list[Rule],
+    context: Context,
+) -> list[Finding]:
+    """items を 1 度だけ走査し、source を対象とするルールの検出結果をエントリーの順に返す"""
+    checks = [(rule.id, rule.check) for rule in rules if source in rule.sources]
+    if not checks:
+        return []
+    findings = []
+    for key, value in items:
+        for rule_id, check in checks:
+            if check(key, value, context):
+                findings.append(Finding(rule_id, key, value, source))
+    return findings
+
+
+# ワーカープロセスで検証するソースの名前・エントリー・ルール・check に渡す context
+# シャードごとにエントリーを送らないよう、ワーカーの起動時に 1 度だけ受け取る
+# (fork で起動する場合は親プロセスのメモリを引き継ぐため、シリアライズもされない)
+# ルールは ID ではなく Rule ごと受け取るため、spawn で起動したワーカーの RULES に
+# 他のモジュールで登録したルールが存在しなくても検証できる (check はモジュールのトップレベルの関数として pickle される)
+worker_source = ""
+worker_items: list[tuple[str, str]] = []
+worker_rules: list[Rule] = []
+worker_context: Context = {}
+
+
+def init_worker(source: str, items: list[tuple[str, str]], rules: list[Rule], context: Context) -> None:
+    global worker_source, worker_items, worker_rules, worker_context
+    worker_source = source
+    worker_items = items
+    worker_rules = rules
+    worker_context = context
+
+
+def check_shard(start: int, stop: int) -> list[Finding]:
+    """worker_items[start:stop] のシャードを検証する (ProcessPoolExecutor のワーカープロセスから呼び出す)"""
+    return check_items(worker_source, worker_items[start:stop], worker_rules, worker_context)
+
+
+def lint(
+    source: str,
+    entries: Mapping[str, str],
+    rules: list[Rule],
+    context: Context | None = None,
+    jobs: int = 1,
+) -> list[Finding]:
+    """
+    source のエントリーを検証し、source を対象とするルールの検出結果をエントリーの順に返す
+
+    jobs に 2 以上を指定した場合は、エントリーをシャードに分割して jobs 個のプロセスで並列に検証する。
+    エントリー数が MIN_SHARD_SIZE 以下で、分割しても 1 シャードにしかならない場合は直列に検証する。
+    """
+    if context is None:
+        context = {source: entries}
+    rules = [rule for rule in rules if source in rule.sources]
+    shard_size = max(MIN_SHARD_SIZE, math.ceil(len(entries) / (jobs * SHARDS_PER_WORKER)))
+    if jobs <= 1 or not rules or len(entries) <= shard_size:
+        return check_items(source, entries.items(), rules, context)
+
+    # ルールが参照するソースのみをワーカーに渡す
+    shared_context = {name: context[name] for rule in rules for name in rule.context_sources if name in context}
+    items = list(entries.items())
+    starts = range(0, len(items), shard_size)
+    stops = [min(start + shard_size, len(items)) for start in starts]
+    findings = []
+    initargs = (source, items, rules, shared_context)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=initargs) as executor:
+        # map() はシャードの順に結果を返すため、連結した結果は直列に検証した場合と同じ順序になる
+        for shard_findings in executor.map(check_shard, starts, stops):
+            findings.extend(shard_findings)
+    return findings
+
+
+def format_text(findings: list[Finding], rules: list[Rule], source: str) -> str:
+    """source の検出結果を、ルールごとに見出しを付けたテキストにする"""
+    sections = []
+    for rule in rules:
+        if source not in rule.sources:
+            continue
+        lines = [f"- {finding.key}: {finding.value}" for finding in findings if finding.rule == rule.id]
+        sections.append("\n".join([rule.description, *lines]) if lines else rule.passed_message)
+    return "\n\n".join(sections)
+
+
+def format_jsonl(findings: list[Finding]) -> str:
+    return "".join(json.dumps(finding._asdict(), ensure_ascii=False) + "\n" for finding in findings)
+
+
+def format_json(findings: list[Finding], rules: list[Rule]) -> str:
+    counts = Counter(finding.rule for finding in findings)
+    report = {
+        "rules": [rule.id for rule in rules],
+        "counts": {rule.id: counts[rule.id] for rule in rules},
+        "findings": [finding._asdict() for finding in findings],
+    }
+    return json.dumps(report, ensure_ascii=False, indent=4) + "\n"
+
+
+def load_context(source_dir: Path) -> dict[str, dict[str, str]]:
+    """検証の対象となるソースを読み込む。存在しないファイルのソースは含めない"""
+    from katakana_map_sources import load_json, load_sources
+
+    context: dict[str, dict[str, str]] = {}
+    if (source_dir / "katakana_map.json").exists():
+        context["katakana_map"] = load_json(source_dir / "katakana_map.json")
+    context.update(load_sources(source_dir))
+    if (source_dir / "katakana_map_merged.json").exists():
+        context["merged"] = load_json(source_dir / "katakana_map_merged.json")
+    return context
+
+
+def main() -> None:
+    current_dir = Path(__file__).parent
+    parser = argparse.ArgumentParser(description="Validate katakana map sources with the registered rules.")
+    parser.add_argument("--rules", nargs="+", help=f"rules to run (default: all enabled rules): {', '.join(RULES)}")
+    parser.add_argument("--enable", nargs="+", default=[], help="also run these disabled-by-default rules")
+    parser.add_argument("--format", choices=["text", "json", "jsonl"], default="text", help="report format")
+    parser.add_argument("--output", type=Path, help="write the report to this file instead of stdout")
+    parser.add_argument("--jobs", type=int, default=1, help="number of processes to validate large sources with")
+    args = parser.parse_args()
+
+    try:
+        rules = select_rules(args.rules, args.enable)
+    except ValueError as e:
+        parser.error(str(e))
+
+    context = load_context(current_dir)
+    findings_by_source = {
+        source: lint(source, entries, rules, context, args.jobs)
+        for source, entries in context.items()
+    }
+    findings = [finding for source_findings in findings_by_source.values() for finding in source_findings]
+
+    if args.format == "jsonl":
+        report = format_jsonl(findings)
+    elif args.format == "json":
+        report = format_json(findings, rules)
+    else:
+        sections = [
+            f"[{source}]\n{format_text(source_findings, rules, source)}"
+            for source, source_findings in findings_by_source.items()
+            if any(source in rule.sources for rule in rules)
+        ]
+        report = "\n\n".join(sections) + "\n"
+
+    if args.output is None:
+        sys.stdout.write(report)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+        print(f"Wrote {len(findings)} findings to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
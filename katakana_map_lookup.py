@@ -0,0 +1,71 @@
+"""
+大量のトークンをまとめてカタカナ辞書で引くためのモジュール
+
+前処理ジョブで扱う数百万個のトークンを、読みの NumPy 配列と辞書に存在したかどうかの bool 型の配列として返す。
+検索自体は dict のハッシュ表で行う薄いラッパーで、トークンごとの dict.get() の呼び出しは map() で C のループに任せる。
+
+ソート済みのキーの配列に対する np.searchsorted() での二分探索も試したが、固定長の Unicode 文字列の比較が重く、
+リスト内包表記で 1 つずつ dict.get() を呼ぶよりも遅かったため採用していない。
+NumPy の文字列の配列を渡した場合は、dict で引くために Python の str のリストへ変換する分だけ遅くなり、
+リスト内包表記で 1 つずつ dict.get() を呼ぶよりも遅い (benchmark_lookup_many.py で約 0.85 倍、リストの場合は約 1.7 倍)。
+そのため、トークンはなるべくリストのまま渡す。
+
+$ pip install numpy
+"""
+
+import functools
+import json
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+
+
+class KatakanaMapIndex:
+    """カタカナ辞書を保持し、トークンをまとめて検索するクラス"""
+
+    def __init__(self, katakana_map: dict[str, str]) -> None:
+        self.katakana_map = katakana_map
+
+    @classmethod
+    def from_json(cls, json_path: Path) -> "KatakanaMapIndex":
+        with open(json_path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def lookup_many(self, tokens: Sequence[str] | np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        トークンのリストまたは NumPy 配列をまとめて検索する
+
+        各トークンの読み (辞書にない場合は None) の配列と、辞書に存在したかどうかを表す bool 型の配列を返す。
+        多次元の NumPy 配列を渡した場合は、戻り値の配列も同じ形になる。
+        """
+        shape = None
+        if isinstance(tokens, np.ndarray):
+            # NumPy の文字列のままでは dict のキーと一致せず、多次元の配列の tolist() はリストの入れ子になるため、
+            # 1 次元にしてから Python の str のリストに変換する
+            shape = tokens.shape
+            tokens = tokens.ravel().tolist()
+        readings = np.fromiter(map(self.katakana_map.get, tokens), dtype=object, count=len(tokens))
+        hits = np.not_equal(readings, None)
+        if shape is not None:
+            return readings.reshape(shape), hits.reshape(shape)
+        return readings, hits
+
+
+@functools.cache
+def default_index() -> KatakanaMapIndex:
+    """katakana_map_merged.json から構築したインデックスを返す (2 回目以降は構築済みのものを返す)"""
+    return KatakanaMapIndex.from_json(Path(__file__).parent / "katakana_map_merged.json")
+
+
+def lookup_many(
+    tokens: Sequence[str] | np.ndarray, index: KatakanaMapIndex | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    トークンをまとめてカタカナ辞書で検索し、読みの配列と辞書に存在したかどうかの配列を返す
+
+    index を省略した場合は katakana_map_merged.json から構築したインデックスを使う。
+    """
+    if index is None:
+        index = default_index()
+    return index.lookup_many(tokens)
@@ -0,0 +1,105 @@
+"""
+複数のカタカナ辞書のソースを、宣言的な優先順位とキーの正規化の規則に従ってマージするモジュール
+
+各ソースには MergeRule で規則を宣言する。規則の並び順が優先順位となり、後の規則のソースほど優先される。
+各ソースのエントリーを出力のキーの小文字でソートし、heapq.merge() で 1 回の k-way マージを行いながら、
+小文字にすると同じになるキーのまとまりごとに優先順位を適用して出力する。
+そのため、出力は最初からキーの小文字でソート済みとなり、マージ後に全体をソートし直す必要はない。
+
+既にソート済みのソース (katakana_map.json や jawiki など) は、リストにコピーせずにエントリーを 1 つずつ heapq.merge() に渡す。
+そのため、マージ中に追加で必要なメモリは、ソート済みでないソース (data.py など) のエントリー数に比例する分のみとなる。
+"""
+
+import heapq
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from typing import NamedTuple
+
+
+class MergeRule(NamedTuple):
+    # ソースの名前 (merge_sources() に渡す sources のキー)
+    name: str
+    # ソースのキーを出力のキーに変換する関数 (None の場合はそのまま)
+    normalize_key: Callable[[str], str] | None = None
+    # False を返したキーをマージの対象から除外する関数 (正規化前のキーを受け取る)
+    include_key: Callable[[str], bool] | None = None
+    # True を返した値は、より優先順位の低いソースに同じキーが存在する場合は上書きしない
+    keep_existing_if: Callable[[str], bool] | None = None
+    # True の場合、既存の値を異なる値で上書きしたときに merge_sources() の on_override を呼び出す
+    report_overrides: bool = False
+
+
+# (ソート用のキー, 規則の番号, ソース内の順番, 出力のキー, 値)
+MergeItem = tuple[str, int, int, str, str]
+
+
+def iter_items(rule: MergeRule, index: int, entries: Mapping[str, str]) -> Iterator[MergeItem]:
+    """ソースのエントリーを、規則に従って正規化したキーとソート用のキーを付けてソース内の順に返す"""
+    for position, (key, value) in enumerate(entries.items()):
+        if rule.include_key is not None and not rule.include_key(key):
+            continue
+        if rule.normalize_key is not None:
+            key = rule.normalize_key(key)
+        yield key.lower(), index, position, key, value
+
+
+def is_presorted(items: Iterable[MergeItem]) -> bool:
+    """items がソート用のキーの順に並んでいるかどうかを返す (同じキーはソース内の順に並ぶため、順序を問わない)"""
+    previous = ""
+    for sort_key, *_ in items:
+        if sort_key < previous:
+            return False
+        previous = sort_key
+    return True
+
+
+def sorted_items(rule: MergeRule, index: int, entries: Mapping[str, str]) -> Iterable[MergeItem]:
+    """
+    ソースのエントリーを、規則に従って正規化したキーの小文字でソートして返す
+
+    既にソート済みのソースは、確認のために 1 度走査した後、リストにコピーせずにエントリーを順に返すイテレーターを返す。
+    """
+    if is_presorted(iter_items(rule, index, entries)):
+        return iter_items(rule, index, entries)
+    return sorted(iter_items(rule, index, entries))
+
+
+def iter_merged(
+    rules: list[MergeRule],
+    sources: Mapping[str, Mapping[str, str]],
+    on_override: Callable[[str, str, str, str], None] | None = None,
+) -> Iterator[tuple[str, str]]:
+    """
+    sources を rules の優先順位に従ってマージし、(キー, 値) をキーの小文字の順に返す
+
+    小文字にすると同じになる異なるキー ("us" と "US" など) は、最も優先順位の低いソースでの出現順に返す。
+    これは、優先順位の低いソースから順に dict を update し、最後にキーの小文字で安定ソートした結果と同じ順序となる。
+    on_override は、report_overrides が指定されたソースが既存の値を異なる値で上書きするたびに
+    (ソースの名前, キー, 既存の値, 新しい値) で呼び出される。
+    """
+    streams = [sorted_items(rule, index, sources[rule.name]) for index, rule in enumerate(rules)]
+    block_key = None
+    # 小文字にすると同じになるキーのまとまり。heapq.merge() は同じソート用のキーを規則の順に返すため、
+    # まとまりの中では優先順位の低いソースのエントリーから順に処理される
+    block: dict[str, str] = {}
+    for sort_key, index, _, key, value in heapq.merge(*streams):
+        if sort_key != block_key:
+            yield from block.items()
+            block = {}
+            block_key = sort_key
+        if key in block:
+            rule = rules[index]
+            if rule.keep_existing_if is not None and rule.keep_existing_if(value):
+                continue
+            if rule.report_overrides and on_override is not None and block[key] != value:
+                on_override(rule.name, key, block[key], value)
+        block[key] = value
+    yield from block.items()
+
+
+def merge_sources(
+    rules: list[MergeRule],
+    sources: Mapping[str, Mapping[str, str]],
+    on_override: Callable[[str, str, str, str], None] | None = None,
+) -> dict[str, str]:
+    """sources を rules の優先順位に従ってマージし、キーの小文字でソート済みの dict を返す"""
+    return dict(iter_merged(rules, sources, on_override))
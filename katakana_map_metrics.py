@@ -0,0 +1,172 @@
+"""
+katakana_map_gen.py のリクエストごとのメトリクスを記録・集計するモジュール
+
+生成中は、リクエストごとに以下のフィールドを持つレコードを katakana_map.metrics.jsonl に 1 行ずつ追記する。
+
+- time: リクエストが完了した時刻 (UNIX 時間)
+- request: リクエストのラベル
+- words: リクエストに含めた単語数
+- latency: バックエンドの応答までにかかった秒数 (リクエストを送信する前にエラーになった場合は null)
+- error: エラーの種類 (成功した場合は null)
+- accepted / non_katakana / missing / truncated: 採用した単語数と、理由ごとの再処理が必要な単語数
+- extra: レスポンスに含まれていた余分な単語数
+- cached: レスポンスをキャッシュから返したかどうか
+- input_tokens / output_tokens: 消費したトークン数 (不明な場合は null)
+
+実行中はレイテンシーのヒストグラムを保持し、進捗とともに p50 / p95 / p99 を表示する。
+記録したメトリクスは、以下のコマンドでスループットと採用 1,000 エントリーあたりの推定コストとして集計できる。
+
+$ python katakana_map_metrics.py [katakana_map.metrics.jsonl] [--input-price 0.075] [--output-price 0.30]
+"""
+
+import argparse
+import json
+import math
+import time
+from collections import Counter
+from pathlib import Path
+
+from katakana_map_journal import iter_records
+
+
+# 100 万トークンあたりの料金 (USD) の既定値 (Gemini 1.5 Flash、128k トークン以下のプロンプト)
+DEFAULT_INPUT_PRICE = 0.075
+DEFAULT_OUTPUT_PRICE = 0.30
+
+# ヒストグラムのバケットの境界の比率と、最小のバケットの上限 (秒)
+# 10% 刻みの対数スケールのため、パーセンタイルの誤差は最大でも 10% に収まる
+BUCKET_RATIO = 1.1
+MIN_BUCKET = 0.001
+
+
+def metrics_path_for(katakana_map_path: Path) -> Path:
+    """katakana_map.json に対応するメトリクスのパス (katakana_map.metrics.jsonl) を返す"""
+    return katakana_map_path.with_suffix(".metrics.jsonl")
+
+
+class LatencyHistogram:
+    """対数スケールのバケットでレイテンシーを数え、パーセンタイルを求めるヒストグラム"""
+
+    def __init__(self) -> None:
+        self.buckets: Counter[int] = Counter()
+        self.count = 0
+
+    def add(self, seconds: float) -> None:
+        bucket = 0 if seconds <= MIN_BUCKET else math.ceil(math.log(seconds / MIN_BUCKET, BUCKET_RATIO))
+        self.buckets[bucket] += 1
+        self.count += 1
+
+    def percentile(self, q: float) -> float:
+        """q パーセンタイル (0 から 100) のレイテンシーを、そのバケットの上限として返す"""
+        if self.count == 0:
+            return 0.0
+        rank = math.ceil(self.count * q / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return MIN_BUCKET * BUCKET_RATIO**bucket
+        return MIN_BUCKET * BUCKET_RATIO ** max(self.buckets)
+
+    def format_percentiles(self) -> str:
+        return ", ".join(f"p{q}: {self.percentile(q):.2f}s" for q in (50, 95, 99))
+
+
+class MetricsLog:
+    """リクエストごとのメトリクスを JSONL に追記し、実行中の集計値を保持するクラス"""
+
+    def __init__(self, path: Path | None) -> None:
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8") if path is not None else None
+        self.latency = LatencyHistogram()
+        self.totals: Counter[str] = Counter()
+        self.started_at = time.time()
+
+    def record(self, **fields) -> None:
+        record = {"time": time.time(), **fields}
+        if record["latency"] is not None:
+            self.latency.add(record["latency"])
+        self.totals["requests"] += 1
+        if record.get("error") is not None:
+            self.totals["errors"] += 1
+        for name in ("words", "accepted", "non_katakana", "missing", "truncated", "extra", "input_tokens", "output_tokens"):
+            self.totals[name] += record.get(name) or 0
+        if self.file is not None:
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.file.flush()
+
+    def format_progress(self) -> str:
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        return (
+            f"{self.totals['accepted'] / elapsed:.1f} words/s, latency {self.latency.format_percentiles()}, "
+            f"rejected: {self.totals['non_katakana']} non-katakana / {self.totals['missing']} missing / "
+            f"{self.totals['truncated']} truncated"
+        )
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+    def __enter__(self) -> "MetricsLog":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def summarize(path: Path, input_price: float = DEFAULT_INPUT_PRICE, output_price: float = DEFAULT_OUTPUT_PRICE) -> str:
+    """メトリクスの JSONL を集計し、スループットと採用 1,000 エントリーあたりの推定コストを含む要約を返す"""
+    latency = LatencyHistogram()
+    totals: Counter[str] = Counter()
+    errors: Counter[str] = Counter()
+    first_time = math.inf
+    last_time = -math.inf
+    for record in iter_records(path):
+        if record["latency"] is not None:
+            latency.add(record["latency"])
+        totals["requests"] += 1
+        if record.get("error") is not None:
+            errors[record["error"]] += 1
+        if record.get("cached"):
+            totals["cached"] += 1
+        for name in ("words", "accepted", "non_katakana", "missing", "truncated", "extra", "input_tokens", "output_tokens"):
+            totals[name] += record.get(name) or 0
+        # レコードの時刻はリクエストの完了時刻のため、開始時刻はレイテンシーの分だけ遡る
+        first_time = min(first_time, record["time"] - (record["latency"] or 0.0))
+        last_time = max(last_time, record["time"])
+
+    if totals["requests"] == 0:
+        return f"No requests recorded in {path}"
+
+    elapsed = max(last_time - first_time, 1e-9)
+    accepted = totals["accepted"]
+    rejected = totals["non_katakana"] + totals["missing"] + totals["truncated"]
+    cost = (totals["input_tokens"] * input_price + totals["output_tokens"] * output_price) / 1_000_000
+    lines = [
+        f"Requests: {totals['requests']} ({sum(errors.values())} errors, {totals['cached']} cached) in {elapsed:.1f}s",
+        f"Throughput: {accepted / elapsed:.1f} accepted words/s, {totals['requests'] / elapsed * 60:.1f} requests/min",
+        f"Latency: {latency.format_percentiles()}",
+        f"Words: {totals['words']} sent, {accepted} accepted, {rejected} rejected "
+        f"({totals['non_katakana']} non-katakana, {totals['missing']} missing, {totals['truncated']} truncated), "
+        f"{totals['extra']} extra",
+        f"Retry rate: {rejected / max(totals['words'], 1) * 100:.1f}% of sent words, "
+        f"{sum(errors.values()) / totals['requests'] * 100:.1f}% of requests failed",
+        f"Errors: {', '.join(f'{kind}: {count}' for kind, count in sorted(errors.items())) or 'none'}",
+        f"Tokens: {totals['input_tokens']} input, {totals['output_tokens']} output",
+        f"Estimated cost: ${cost:.4f} (${cost / max(accepted, 1) * 1000:.4f} per 1k accepted entries)",
+    ]
+    return "\n".join(lines)
+
+
+def main() -> None:
+    current_dir = Path(__file__).parent
+    parser = argparse.ArgumentParser(description="Summarize katakana_map_gen.py request metrics.")
+    parser.add_argument("path", type=Path, nargs="?", default=metrics_path_for(current_dir / "katakana_map.json"))
+    parser.add_argument("--input-price", type=float, default=DEFAULT_INPUT_PRICE, help="USD per 1M input tokens")
+    parser.add_argument("--output-price", type=float, default=DEFAULT_OUTPUT_PRICE, help="USD per 1M output tokens")
+    args = parser.parse_args()
+    print(summarize(args.path, args.input_price, args.output_price))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+マージ済みのカタカナ辞書のキーに対して最小完全ハッシュ (CHD 方式) を構築し、完全一致検索を行うためのモジュール
+
+事前に全てのキーを 0 から N - 1 までのスロットに衝突なく割り当てる変位テーブルと再配置テーブルを構築しておくことで、
+検索時はハッシュを 1 回計算し、スロットに格納されたキーと 1 回比較するだけで値を取得できる。
+エントリー本体は katakana_map_binary.py と同じエントリー表の形式でスロット順に格納し、mmap で開いて使う。
+そのため、エントリーごとの Python オブジェクトは一切作られない。
+
+ファイルフォーマット (全てリトルエンディアン):
+- ヘッダー: マジックナンバー b"KMPH" (4 バイト) / バージョン (uint32) / エントリー数 N (uint32) / ハッシュ表のサイズ M (uint32) / バケット数 B (uint32)
+- 変位テーブル (uint64 x B)
+- 再配置テーブル (uint32 x (M - N))
+- エントリー表 (katakana_map_binary.pack_entry_table() の形式、スロット順)
+
+$ python katakana_map_mph.py [katakana_map_merged.json] [katakana_map_merged.kmph]
+"""
+
+import hashlib
+import json
+import math
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+from katakana_map_binary import EntryTable, pack_entry_table
+
+
+MAGIC = b"KMPH"
+VERSION = 1
+HEADER = struct.Struct("<4sIIII")
+DISPLACEMENT = struct.Struct("<Q")
+REMAP = struct.Struct("<I")
+
+# 1 バケットあたりの平均キー数
+# 大きくするほど変位テーブルは小さくなるが、構築に時間がかかるようになる
+BUCKET_SIZE = 3
+
+# スロット数に対するキー数の割合
+# 全てのスロットを埋めようとすると最後の方のバケットで変位の探索が極端に遅くなるため、
+# 少し余裕を持たせた表でハッシュを構築してから、はみ出したキーを再配置テーブルで空きスロットに詰め直す
+LOAD_FACTOR = 0.99
+
+
+def hash_key(key: bytes) -> tuple[int, int, int]:
+    """キーから、バケット選択用の 1 つとスロット計算用の 2 つの計 3 つの 32bit ハッシュ値を計算する"""
+    value = int.from_bytes(hashlib.blake2b(key, digest_size=12).digest(), "little")
+    return value & 0xFFFFFFFF, (value >> 32) & 0xFFFFFFFF, value >> 64
+
+
+def find_slot(h1: int, h2: int, displacement: int, size: int) -> int:
+    """
+    変位からスロット番号を計算する
+
+    変位を 1 ずつ増やしながら探索したときに、バケット内のキーがそれぞれ独立した位置に移動するよう、
+    変位の下位の桁を h2 の係数 d0 に、上位の桁を平行移動量 d1 に割り当てる。
+    """
+    d1, d0 = divmod(displacement, size)
+    return (h1 + d0 * h2 + d1) % size
+
+
+def build_displacements(hashes: list[tuple[int, int, int]], table_size: int) -> tuple[array, list[int]]:
+    """
+    CHD アルゴリズムで各バケットの変位を決定する
+
+    変位テーブルと、各キーが割り当てられたスロット番号 (0 以上 table_size 未満) のリストを返す。
+    """
+    bucket_count = max(1, (len(hashes) + BUCKET_SIZE - 1) // BUCKET_SIZE)
+    buckets: list[list[int]] = [[] for _ in range(bucket_count)]
+    for index, (h0, _, _) in enumerate(hashes):
+        buckets[h0 % bucket_count].append(index)
+
+    displacements = array("Q", [0]) * bucket_count
+    slots = [0] * len(hashes)
+    occupied = bytearray(table_size)
+
+    # キーの多いバケットから順に、空いているスロットに全てのキーが収まる変位を探す
+    for bucket in sorted(range(bucket_count), key=lambda b: len(buckets[b]), reverse=True):
+        indices = buckets[bucket]
+        if not indices:
+            break
+        bucket_hashes = [hashes[index] for index in indices]
+        displacement = 0
+        while True:
+            candidate = [find_slot(h1, h2, displacement, table_size) for _, h1, h2 in bucket_hashes]
+            if len(set(candidate)) == len(candidate) and not any(occupied[slot] for slot in candidate):
+                break
+            displacement += 1
+            if displacement >= table_size * table_size:
+                raise ValueError("Failed to build a perfect hash (duplicate keys?)")
+        displacements[bucket] = displacement
+        for index, slot in zip(indices, candidate):
+            slots[index] = slot
+            occupied[slot] = 1
+
+    return displacements, slots
+
+
+def build_remap(slots: list[int], table_size: int) -> array:
+    """
+    N 以上のスロットに割り当てられたキーを、N 未満の空きスロットに詰め直すための再配置テーブルを作成する
+
+    再配置テーブルの (スロット番号 - N) 番目の要素が、詰め直した先のスロット番号となる。
+    """
+    size = len(slots)
+    occupied = bytearray(table_size)
+    for slot in slots:
+        occupied[slot] = 1
+    free_slots = iter([slot for slot in range(size) if not occupied[slot]])
+    remap = array("I", [0]) * (table_size - size)
+    for slot in range(size, table_size):
+        if occupied[slot]:
+            remap[slot - size] = next(free_slots)
+    return remap
+
+
+def build_perfect_hash(katakana_map: dict[str, str], output_file: Path) -> None:
+    """カタカナ辞書の最小完全ハッシュを構築して保存する"""
+    entries = [(key.encode("utf-8"), value.encode("utf-8")) for key, value in katakana_map.items()]
+    table_size = max(1, math.ceil(len(entries) / LOAD_FACTOR))
+    displacements, slots = build_displacements([hash_key(key) for key, _ in entries], table_size)
+    remap = build_remap(slots, table_size)
+
+    slot_entries: list[tuple[bytes, bytes]] = [(b"", b"")] * len(entries)
+    for entry, slot in zip(entries, slots):
+        if slot >= len(entries):
+            slot = remap[slot - len(entries)]
+        slot_entries[slot] = entry
+
+    if sys.byteorder != "little":
+        displacements.byteswap()
+        remap.byteswap()
+    with open(output_file, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries), table_size, len(displacements)))
+        f.write(displacements.tobytes())
+        f.write(remap.tobytes())
+        f.write(pack_entry_table(slot_entries))
+
+
+class PerfectHashKatakanaMap:
+    """build_perfect_hash() で作成した最小完全ハッシュを mmap で開き、dict と同様のインターフェイスで検索するクラス"""
+
+    def __init__(self, path: Path) -> None:
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size, self.table_size, self.bucket_count = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self.mmap.close()
+            raise ValueError(f"{path} is not a katakana map perfect hash (version {VERSION})")
+        self.remap_start = HEADER.size + DISPLACEMENT.size * self.bucket_count
+        table_start = self.remap_start + REMAP.size * (self.table_size - self.size)
+        self.table = EntryTable(self.mmap, table_start, self.size)
+
+    def close(self) -> None:
+        self.mmap.close()
+
+    def __enter__(self) -> "PerfectHashKatakanaMap":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def find(self, key: str) -> int:
+        """キーが格納されているスロット番号を返す。キーが存在しない場合は -1 を返す"""
+        if self.size == 0:
+            return -1
+        encoded_key = key.encode("utf-8")
+        h0, h1, h2 = hash_key(encoded_key)
+        displacement = DISPLACEMENT.unpack_from(self.mmap, HEADER.size + DISPLACEMENT.size * (h0 % self.bucket_count))[0]
+        slot = find_slot(h1, h2, displacement, self.table_size)
+        if slot >= self.size:
+            slot = REMAP.unpack_from(self.mmap, self.remap_start + REMAP.size * (slot - self.size))[0]
+        # 辞書に存在しないキーも何らかのスロットに割り当てられるため、格納されているキーと照合する
+        if self.table.key_at(slot) != encoded_key:
+            return -1
+        return slot
+
+    def get(self, key: str, default: str | None = None) -> str | None:
+        slot = self.find(key)
+        if slot < 0:
+            return default
+        return self.table.value_at(slot).decode("utf-8")
+
+    def __getitem__(self, key: str) -> str:
+        slot = self.find(key)
+        if slot < 0:
+            raise KeyError(key)
+        return self.table.value_at(slot).decode("utf-8")
+
+    def __contains__(self, key: str) -> bool:
+        return self.find(key) >= 0
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def main() -> None:
+    current_dir = Path(__file__).parent
+    input_file = Path(sys.argv[1]) if len(sys.argv) > 1 else current_dir / "katakana_map_merged.json"
+    output_file = Path(sys.argv[2]) if len(sys.argv) > 2 else input_file.with_suffix(".kmph")
+
+    with open(input_file, "r", encoding="utf-8") as f:
+        katakana_map = json.load(f)
+
+    build_perfect_hash(katakana_map, output_file)
+    print(f"Built a minimal perfect hash of {len(katakana_map)} entries to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
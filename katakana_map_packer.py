@@ -0,0 +1,71 @@
+"""
+katakana_map_gen.py のリクエストに詰め込む単語数を、出力トークン数の見積もりに基づいて決めるモジュール
+
+出力の 1 行 ("単語,カタカナ") のトークン数は、英単語の長さと、カタカナと英単語の文字数の比から見積もる。
+各リクエストには、見積もった出力トークン数の合計が予算に収まるまで単語を詰め込む。
+
+レスポンスキャッシュに同じリクエストが残っていれば再実行時にモデルを呼び出さずに済むよう、
+チャンクの分け方は単語のリストと設定のみから決まり、実行中の状況 (完了した順序や生成された読み) には左右されない。
+そのため、文字数の比と予算は実行中に更新せず、固定の値を使う。
+出力が打ち切られた単語はリトライの回 (ラウンド) ごとにまとめ直し、回を重ねるごとに予算を SHRINK_FACTOR 倍に減らして送る。
+"""
+
+
+# 英語はおおよそ 4 文字で 1 トークン、カタカナはおおよそ 1 文字で 1 トークンとなる
+ENGLISH_CHARS_PER_TOKEN = 4
+KATAKANA_TOKENS_PER_CHAR = 1.0
+# 区切りのカンマと改行の分
+SEPARATOR_TOKENS = 2
+
+# カタカナと英単語の文字数の比 (katakana_map_merged.json 全体でおおよそこの値になる)
+DEFAULT_KATAKANA_RATIO = 0.8
+
+# リトライの回ごとに予算を減らす倍率
+SHRINK_FACTOR = 0.75
+
+
+class RequestPacker:
+    """出力トークン数の予算に収まるよう、単語のリストをリクエストごとのチャンクに分けるクラス"""
+
+    def __init__(
+        self,
+        max_output_tokens: int,
+        target_ratio: float = 0.75,
+        max_words: int = 1000,
+        min_words: int = 10,
+        katakana_ratio: float = DEFAULT_KATAKANA_RATIO,
+    ) -> None:
+        # 見積もりの誤差で打ち切られないよう、max_output_tokens の target_ratio 倍を予算の上限とする
+        self.max_budget = max_output_tokens * target_ratio
+        self.min_budget = self.max_budget / 16
+        self.max_words = max_words
+        self.min_words = min_words
+        self.katakana_ratio = katakana_ratio
+
+    def estimate_output_tokens(self, word: str) -> float:
+        """単語 1 つ分の出力 ("単語,カタカナ") のトークン数を見積もる"""
+        english_tokens = len(word) / ENGLISH_CHARS_PER_TOKEN + 1
+        katakana_tokens = len(word) * self.katakana_ratio * KATAKANA_TOKENS_PER_CHAR
+        return english_tokens + katakana_tokens + SEPARATOR_TOKENS
+
+    def budget_for(self, retry_round: int) -> float:
+        """retry_round 回目のリトライ (0 は最初の送信) で、1 リクエストに詰め込む出力トークン数の予算を返す"""
+        return max(self.min_budget, self.max_budget * SHRINK_FACTOR**retry_round)
+
+    def plan(self, words: list[str], retry_round: int = 0) -> list[list[str]]:
+        """words を先頭から順に、見積もった出力トークン数の合計が予算に収まるチャンクに分ける"""
+        budget = self.budget_for(retry_round)
+        chunks: list[list[str]] = []
+        chunk: list[str] = []
+        tokens = 0.0
+        for word in words:
+            word_tokens = self.estimate_output_tokens(word)
+            if len(chunk) >= self.max_words or (tokens + word_tokens > budget and len(chunk) >= self.min_words):
+                chunks.append(chunk)
+                chunk = []
+                tokens = 0.0
+            chunk.append(word)
+            tokens += word_tokens
+        if chunk:
+            chunks.append(chunk)
+        return chunks
@@ -0,0 +1,143 @@
+"""
+katakana_map_gen.py の並行リクエストが共有するレートリミッターと、エラーの種類に応じたバックオフをまとめたモジュール
+
+RateLimiter は 1 分あたりのリクエスト数とトークン数の 2 つのトークンバケットを持ち、全てのワーカーは
+リクエストの送信前に acquire() で両方のバケットから必要な分を取得する。
+クォータ超過のエラーを受け取った場合は pause() で全てのワーカーの送信を一時停止する。
+
+リトライ時の待ち時間は、エラーの種類ごとに決めた基準値から指数的に増やした上限までの一様乱数 (full jitter) とする。
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter
+from typing import NamedTuple
+
+
+class MalformedResponseError(Exception):
+    """レスポンスから CSV として 1 行も読み取れなかった場合に送出する例外"""
+
+
+class BackoffPolicy(NamedTuple):
+    """エラーの種類ごとのリトライ方針"""
+
+    base_delay: float
+    max_delay: float
+    max_retries: int
+
+
+# エラーの種類ごとのリトライ方針
+BACKOFF_POLICIES = {
+    # クォータ超過は時間を置けば解消するため、長めに待って粘り強くリトライする
+    "quota": BackoffPolicy(base_delay=10.0, max_delay=120.0, max_retries=30),
+    # セーフティフィルターによるブロックは同じ入力で繰り返しても解消しにくいため、すぐに諦める
+    "safety": BackoffPolicy(base_delay=1.0, max_delay=5.0, max_retries=2),
+    # CSV として読み取れないレスポンスは、生成し直せば解消することが多い
+    "malformed": BackoffPolicy(base_delay=1.0, max_delay=10.0, max_retries=5),
+    # タイムアウトやサーバーエラーなどの一時的なエラー
+    "transient": BackoffPolicy(base_delay=2.0, max_delay=60.0, max_retries=10),
+}
+
+
+def classify_error(error: BaseException) -> str:
+    """例外を BACKOFF_POLICIES のいずれかのエラーの種類に分類する"""
+    if isinstance(error, MalformedResponseError):
+        return "malformed"
+    # google-generativeai / google-api-core の例外クラスを import せずに判定できるよう、クラス名とメッセージで分類する
+    name = type(error).__name__
+    message = str(error).lower()
+    if name in ("ResourceExhausted", "TooManyRequests") or "429" in message or "quota" in message:
+        return "quota"
+    if name in ("BlockedPromptException", "StopCandidateException") or "safety" in message or "blocked" in message:
+        return "safety"
+    return "transient"
+
+
+def backoff_delay(kind: str, attempt: int) -> float:
+    """attempt 回目 (1 始まり) のリトライまでの待ち時間を返す"""
+    policy = BACKOFF_POLICIES[kind]
+    return random.uniform(0, min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1)))
+
+
+def estimate_tokens(text: str) -> int:
+    """テキストのおおよそのトークン数を返す (英単語の場合、おおよそ 4 文字で 1 トークンとなる)"""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """1 分あたり per_minute 個の割合で補充される、容量 per_minute のトークンバケット"""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: float) -> float:
+        """amount 個のトークンを取得する。取得までに待った秒数を返す"""
+        # バケットの容量を超える量は一度に取得できないため、容量で打ち切る
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        # ロックを保持したまま待つことで、先に待ち始めたワーカーから順にトークンを取得させる
+        async with self.lock:
+            self.refill()
+            while self.tokens < amount:
+                delay = (amount - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self.refill()
+            self.tokens -= amount
+        return waited
+
+    def adjust(self, amount: float) -> None:
+        """事前に見積もって取得したトークン数と実際の消費量の差を反映する (amount が負の場合は返却する)"""
+        self.refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RateLimiter:
+    """全てのワーカーで共有する、リクエスト数とトークン数のレートリミッター"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float) -> None:
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+        # スロットリングやリトライの回数などのカウンター
+        self.counters: Counter[str] = Counter()
+
+    async def acquire(self, tokens: int) -> None:
+        """リクエストを 1 回送信する権利と、tokens 個のトークンを取得する"""
+        while (delay := self.paused_until - time.monotonic()) > 0:
+            self.counters["paused"] += 1
+            await asyncio.sleep(delay)
+        waited = await self.requests.acquire(1) + await self.tokens.acquire(tokens)
+        self.counters["requests"] += 1
+        self.counters["estimated_tokens"] += tokens
+        if waited > 0:
+            self.counters["throttled"] += 1
+            self.counters["throttled_seconds"] += round(waited)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """レスポンスから得た実際のトークン数で、見積もりとの差を補正する"""
+        self.tokens.adjust(actual_tokens - estimated_tokens)
+        self.counters["tokens"] += actual_tokens
+
+    def pause(self, seconds: float) -> None:
+        """全てのワーカーの送信を seconds 秒間停止する"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def record_retry(self, kind: str) -> None:
+        self.counters[f"retries_{kind}"] += 1
+
+    def record_give_up(self, kind: str) -> None:
+        self.counters[f"give_ups_{kind}"] += 1
+
+    def format_counters(self) -> str:
+        return ", ".join(f"{name}: {count}" for name, count in sorted(self.counters.items()))
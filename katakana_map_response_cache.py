@@ -0,0 +1,91 @@
+"""
+LLM へのリクエストに対する生のレスポンスをディスクに保存する、内容アドレス方式のキャッシュ
+
+キャッシュのキーは、モデル名・生成設定・システムプロンプト・few-shot の履歴・入力の単語リストを
+JSON にシリアライズした結果の SHA-256 ハッシュとする。いずれかが変わればキーも変わるため、明示的な無効化は不要となる。
+生のレスポンスを保存しておくことで、レスポンスの解析や検証の処理を変更した場合でも、モデルを呼び出さずに再実行できる。
+
+各エントリーは <キャッシュディレクトリ>/<ハッシュの先頭 2 文字>/<ハッシュ>.json に保存する。
+合計サイズが max_bytes を超えた場合は、最終アクセス日時 (ファイルの更新日時) が古いエントリーから削除する。
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+
+class ResponseCache:
+    """生のレスポンスをディスクに保存するキャッシュ"""
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # ヒット数やミス数などのカウンター
+        self.stats: Counter[str] = Counter()
+        self.total_bytes = sum(path.stat().st_size for path in self.cache_dir.glob("*/*.json"))
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        """キャッシュのキーとなるハッシュ値を計算する"""
+        serialized = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> dict | None:
+        """キーに対応するエントリーを返す。存在しない場合は None を返す"""
+        path = self.path_for(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.stats["misses"] += 1
+            return None
+        # 最終アクセス日時として更新日時を更新し、削除の対象になりにくくする
+        os.utime(path)
+        self.stats["hits"] += 1
+        return entry
+
+    def put(self, key: str, entry: dict) -> None:
+        """エントリーを保存し、合計サイズが上限を超えた場合は古いエントリーを削除する"""
+        path = self.path_for(key)
+        path.parent.mkdir(exist_ok=True)
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        if path.exists():
+            self.total_bytes -= path.stat().st_size
+        temporary_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        temporary_path.write_bytes(data)
+        os.replace(temporary_path, path)
+        self.total_bytes += len(data)
+        self.stats["writes"] += 1
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """合計サイズが上限の 90% 以下になるまで、最終アクセス日時が古いエントリーから削除する"""
+        target_bytes = self.max_bytes * 0.9
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        for _, size, path in entries:
+            if self.total_bytes <= target_bytes:
+                break
+            path.unlink(missing_ok=True)
+            self.total_bytes -= size
+            self.stats["evictions"] += 1
+
+    def format_stats(self) -> str:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / lookups * 100 if lookups else 0.0
+        return (
+            f"hits: {self.stats['hits']}, misses: {self.stats['misses']} ({hit_rate:.1f}% hit rate), "
+            f"writes: {self.stats['writes']}, evictions: {self.stats['evictions']}, "
+            f"size: {self.total_bytes / 1024 / 1024:.1f} MiB / {self.max_bytes / 1024 / 1024:.1f} MiB"
+        )
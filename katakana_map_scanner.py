@@ -0,0 +1,336 @@
+"""
+日本語と英語が混在した文から、カタカナ辞書に含まれる英単語を全て検出して置換するためのモジュール
+
+「iPhoneを買った」のような文を TTS に渡す前に英単語をカタカナに置き換えるため、辞書の全てのキーから
+Aho-Corasick オートマトンを構築し、入力文を 1 回走査するだけで全ての一致箇所を検出する。
+一致箇所が重なる場合は、より左から始まり、その中でもより長いものを優先する。
+また、英数字の途中から始まったり途中で終わったりする一致は単語の一部とみなして除外する
+(例: "concatenate" の中の "cat" には一致しない) 。
+
+オートマトンの goto 関数には katakana_map_trie.KatakanaTrie をそのまま使い、失敗関数などの追加の配列のみを持つ。
+構築したオートマトンは辞書ファイルの内容のハッシュをキーとして __pycache__ 以下にキャッシュされる。
+
+巨大なファイルを変換する場合は convert_stream() を使うと、入力を少しずつ読み込みながら変換結果を順次出力できる。
+
+$ python katakana_map_scanner.py "iPhoneを買った" [katakana_map_merged.json]
+$ python katakana_map_scanner.py - [katakana_map_merged.json] < input.txt > output.txt
+"""
+
+import hashlib
+import json
+import marshal
+import os
+import string
+import sys
+from array import array
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import NamedTuple
+
+from katakana_map_trie import KatakanaTrie
+
+
+CACHE_VERSION = 1
+
+# 一致箇所の前後がこれらの文字同士で隣接している場合は、単語の途中とみなす
+WORD_CHARS = frozenset(string.ascii_letters + string.digits)
+
+# 文字列の長さを変えずに ASCII の大文字のみを小文字に変換するための変換表
+ASCII_LOWER_TABLE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# convert_stream() で、この文字数以上の入力が溜まるまでは変換を行わない
+# 小さいチャンクが大量に渡された場合に、チャンク境界付近の同じ文字列を何度も走査しないようにするため
+STREAM_BUFFER_SIZE = 65536
+
+
+class ScanMatch(NamedTuple):
+    """入力文中で辞書のキーに一致した箇所"""
+
+    start: int
+    end: int
+    key: str
+    reading: str
+
+
+class KatakanaScanner:
+    """カタカナ辞書のキーから構築した Aho-Corasick オートマトンで、入力文中の英単語を検出するクラス"""
+
+    def __init__(
+        self,
+        trie: KatakanaTrie,
+        fail: array,
+        dict_links: array,
+        depths: array,
+        cased_readings: dict[str, str],
+    ) -> None:
+        self.trie = trie
+        self.fail = fail
+        self.dict_links = dict_links
+        self.depths = depths
+        self.cased_readings = cased_readings
+        self.max_key_length = max(depths, default=0)
+
+    @classmethod
+    def build(cls, katakana_map: dict[str, str]) -> "KatakanaScanner":
+        """カタカナ辞書から Aho-Corasick オートマトンを構築する"""
+        # 大文字小文字を区別せずに検出するため、オートマトンは小文字化したキーで構築する
+        # 小文字化したキーが衝突する場合は、元々小文字のキーの読みを優先する
+        lowered_map: dict[str, str] = {}
+        cased_readings: dict[str, str] = {}
+        for key, value in katakana_map.items():
+            lowered_key = key.translate(ASCII_LOWER_TABLE)
+            if lowered_key == key:
+                lowered_map[key] = value
+            else:
+                lowered_map.setdefault(lowered_key, value)
+                # 頭字語など、小文字化すると別の読みになるキーは元の表記のまま検出した場合にのみ使う
+                cased_readings[key] = value
+        trie = KatakanaTrie.build(lowered_map)
+
+        labels = trie.labels
+        first_edges = trie.first_edges
+        node_values = trie.node_values
+        node_count = len(node_values)
+        fail = array("I", [0]) * node_count
+        dict_links = array("i", [-1]) * node_count
+        depths = array("H", [0]) * node_count
+
+        # トライ木のノードは幅優先順に並んでいるため、番号順に処理すれば親ノードの失敗遷移は必ず決まっている
+        for node in range(node_count):
+            for edge in range(first_edges[node], first_edges[node + 1]):
+                child = edge + 1
+                char = labels[edge]
+                depths[child] = depths[node] + 1
+                if node == 0:
+                    fail[child] = 0
+                else:
+                    state = fail[node]
+                    while True:
+                        next_edge = labels.find(char, first_edges[state], first_edges[state + 1])
+                        if next_edge >= 0:
+                            fail[child] = next_edge + 1
+                            break
+                        if state == 0:
+                            fail[child] = 0
+                            break
+                        state = fail[state]
+                # 失敗遷移を辿って最初に見つかる、キーの終端となるノードへのリンク
+                fail_state = fail[child]
+                dict_links[child] = fail_state if node_values[fail_state] >= 0 else dict_links[fail_state]
+
+        return cls(trie, fail, dict_links, depths, cased_readings)
+
+    def save(self, path: Path) -> None:
+        """オートマトンを marshal 形式でファイルに保存する"""
+        trie = self.trie
+        data = (
+            CACHE_VERSION,
+            trie.first_edges.tobytes(),
+            trie.labels,
+            trie.node_values.tobytes(),
+            trie.value_starts.tobytes(),
+            trie.value_ends.tobytes(),
+            trie.value_heap,
+            self.fail.tobytes(),
+            self.dict_links.tobytes(),
+            self.depths.tobytes(),
+            self.cased_readings,
+        )
+        # 複数プロセスから同時に書き込まれても壊れないよう、一時ファイルに書いてから置き換える
+        tmp_path = Path(path).with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            marshal.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "KatakanaScanner":
+        """save() で保存したオートマトンを読み込む"""
+        with open(path, "rb") as f:
+            data = marshal.load(f)
+        if data[0] != CACHE_VERSION:
+            raise ValueError(f"{path} is not a katakana scanner cache (version {CACHE_VERSION})")
+        (
+            _,
+            first_edges,
+            labels,
+            node_values,
+            value_starts,
+            value_ends,
+            value_heap,
+            fail,
+            dict_links,
+            depths,
+            cased_readings,
+        ) = data
+        trie = KatakanaTrie(
+            array("I", first_edges),
+            labels,
+            array("i", node_values),
+            array("I", value_starts),
+            array("I", value_ends),
+            value_heap,
+        )
+        return cls(trie, array("I", fail), array("i", dict_links), array("H", depths), cased_readings)
+
+    @classmethod
+    def from_json(cls, json_path: Path, cache_dir: Path | None = None) -> "KatakanaScanner":
+        """
+        JSON 形式のカタカナ辞書からオートマトンを読み込む
+
+        辞書ファイルの内容のハッシュをキーとしたキャッシュが存在すればそれを使い、なければ構築してキャッシュに保存する。
+        """
+        json_bytes = Path(json_path).read_bytes()
+        digest = hashlib.sha256(json_bytes).hexdigest()
+        if cache_dir is None:
+            cache_dir = Path(__file__).parent / "__pycache__"
+        cache_path = cache_dir / f"katakana_map_scanner.{digest[:16]}.marshal"
+        try:
+            return cls.load(cache_path)
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+        scanner = cls.build(json.loads(json_bytes))
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        scanner.save(cache_path)
+        return scanner
+
+    def find_all(self, text: str, start: int = 0) -> list[ScanMatch]:
+        """
+        text 中の辞書のキーに一致する箇所を、重ならないように左から順に全て返す
+
+        start を指定した場合は、start 以降から始まる一致箇所のみを返す。
+        それより前の文字は、単語の境界の判定にのみ使われる。
+        """
+        labels = self.trie.labels
+        first_edges = self.trie.first_edges
+        node_values = self.trie.node_values
+        fail = self.fail
+        dict_links = self.dict_links
+        depths = self.depths
+        lowered_text = text.translate(ASCII_LOWER_TABLE)
+        text_length = len(text)
+
+        # 各開始位置から始まる、単語の境界の条件を満たす最長の一致箇所の終了位置
+        longest_ends: dict[int, int] = {}
+        state = 0
+        for index, char in enumerate(lowered_text):
+            while True:
+                edge = labels.find(char, first_edges[state], first_edges[state + 1])
+                if edge >= 0:
+                    state = edge + 1
+                    break
+                if state == 0:
+                    break
+                state = fail[state]
+
+            output = state if node_values[state] >= 0 else dict_links[state]
+            if output < 0:
+                continue
+            end = index + 1
+            # 末尾が英数字の途中であれば、このノードで終わる全ての一致が単語の境界の条件を満たさない
+            if end < text_length and text[index] in WORD_CHARS and text[end] in WORD_CHARS:
+                continue
+            while output >= 0:
+                match_start = end - depths[output]
+                if match_start >= start and (
+                    match_start == 0
+                    or text[match_start - 1] not in WORD_CHARS
+                    or text[match_start] not in WORD_CHARS
+                ):
+                    if longest_ends.get(match_start, 0) < end:
+                        longest_ends[match_start] = end
+                output = dict_links[output]
+
+        # 左から順に、各位置から始まる最長の一致箇所を重ならないように選ぶ
+        matches = []
+        position = start
+        for match_start in sorted(longest_ends):
+            if match_start < position:
+                continue
+            end = longest_ends[match_start]
+            key = text[match_start:end]
+            reading = self.cased_readings.get(key)
+            if reading is None:
+                reading = self.trie[lowered_text[match_start:end]]
+            matches.append(ScanMatch(match_start, end, key, reading))
+            position = end
+        return matches
+
+    def convert_until(self, text: str, start: int, cut: int) -> tuple[str, int]:
+        """
+        text[start:] のうち、cut より前から始まる一致箇所までを変換する
+
+        変換後の文字列と、変換した範囲の終了位置 (cut 以上) を返す。
+        """
+        parts = []
+        position = start
+        for match in self.find_all(text, start=start):
+            if match.start >= cut:
+                break
+            parts.append(text[position : match.start])
+            parts.append(match.reading)
+            position = match.end
+        # 最後の一致箇所の後から cut までの間には、一致箇所は始まらない
+        end = max(position, cut)
+        parts.append(text[position:end])
+        return "".join(parts), end
+
+    def replace(self, text: str) -> str:
+        """text 中の辞書のキーに一致する箇所を全てカタカナに置換する"""
+        return self.convert_until(text, 0, len(text))[0]
+
+    def convert_stream(self, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        少しずつ読み込んだ文字列を変換し、変換が確定した部分から順に返す
+
+        チャンクの境界をまたぐ単語も正しく変換される。保持する入力は STREAM_BUFFER_SIZE と
+        最長のキーの長さ程度に収まるため、ファイル全体をメモリに読み込む必要はない。
+        """
+        # buffer は未出力の入力、context は buffer の直前の 1 文字 (単語の境界の判定に使う)
+        buffer = ""
+        context = ""
+        for chunk in chunks:
+            buffer += chunk
+            if not buffer or len(buffer) < max(STREAM_BUFFER_SIZE, self.max_key_length * 2):
+                continue
+            # cut より前から始まる一致箇所は、最長のキーでも buffer の末尾の手前で終わるため、
+            # その直後の文字も含めて判定に必要な情報が全て揃っている
+            text = context + buffer
+            converted, end = self.convert_until(text, len(context), len(text) - self.max_key_length)
+            yield converted
+            context = text[end - 1]
+            buffer = text[end:]
+
+        if buffer:
+            text = context + buffer
+            yield self.convert_until(text, len(context), len(text))[0]
+
+
+def convert_stream(chunks: Iterable[str], scanner: KatakanaScanner | None = None) -> Iterator[str]:
+    """
+    少しずつ読み込んだ文字列をカタカナ辞書で変換し、変換が確定した部分から順に返す
+
+    scanner を省略した場合は katakana_map_merged.json から構築したオートマトンを使う。
+    """
+    if scanner is None:
+        scanner = KatakanaScanner.from_json(Path(__file__).parent / "katakana_map_merged.json")
+    return scanner.convert_stream(chunks)
+
+
+def main() -> None:
+    current_dir = Path(__file__).parent
+    text = sys.argv[1]
+    json_path = Path(sys.argv[2]) if len(sys.argv) > 2 else current_dir / "katakana_map_merged.json"
+
+    scanner = KatakanaScanner.from_json(json_path)
+    if text == "-":
+        # 標準入力を 1 行ずつ読み込みながら変換して出力する
+        for converted in scanner.convert_stream(sys.stdin):
+            sys.stdout.write(converted)
+        return
+    for match in scanner.find_all(text):
+        print(f"{match.start}-{match.end}: {match.key} -> {match.reading}")
+    print(scanner.replace(text))
+
+
+if __name__ == "__main__":
+    main()
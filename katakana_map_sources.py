@@ -0,0 +1,97 @@
+"""
+katakana_map_cleaner.py がマージするカタカナ辞書のソースをまとめたモジュール
+
+katakana_map_cleaner.py は、katakana_map.json (LLM で生成した読み) を土台に、以下の順でソースを上書きマージする。
+この優先順位とキーの正規化の規則は MERGE_RULES で宣言し、katakana_map_merge.merge_sources() で適用する。
+
+1. data.py: ただし値に "トゥ" が含まれ、かつ katakana_map.json にキーが存在する場合は katakana_map.json の値を優先する
+2. katakana_map_fix_s.json
+3. katakana_map_manual_proper_noun.json: キーは小文字に変換し、半角スペースを含む (=複数単語の) キーは除外する
+4. katakana_map_jawiki.json: キーは小文字に変換する
+5. katakana_map_manual_acronym.json: 大文字のキーのまま追加するため、小文字のキーの値は上書きしない
+
+load_overriding_keys() は、katakana_map.json にどんな読みを生成しても、マージ時に必ず他のソースの値で上書きされるキーを返す。
+katakana_map_gen.py はこれらのキーをリクエストの対象から除外し、捨てられることが確定している読みの生成を省く。
+
+load_word_frequencies() は、katakana_map_gen.py の処理順や CompoundSplitter の分割の選択に使う単語の頻度ファイルを読み込む。
+"""
+
+import json
+from pathlib import Path
+
+from katakana_map_merge import MergeRule
+
+
+FIX_S_FILE = "katakana_map_fix_s.json"
+MANUAL_PROPER_NOUN_FILE = "katakana_map_manual_proper_noun.json"
+JAWIKI_FILE = "katakana_map_jawiki.json"
+MANUAL_ACRONYM_FILE = "katakana_map_manual_acronym.json"
+
+
+def load_json(path: Path) -> dict[str, str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_word_frequencies(path: Path) -> dict[str, int]:
+    """
+    「単語 出現回数」の形式で 1 行に 1 単語ずつ書かれた頻度ファイルを読み込む
+
+    単語と出現回数の間はタブまたは空白で区切る。空行と # から始まる行は無視する。
+    """
+    frequencies: dict[str, int] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            word, count = line.rsplit(maxsplit=1)
+            frequencies[word.lower()] = frequencies.get(word.lower(), 0) + int(count)
+    return frequencies
+
+
+def contains_tu(value: str) -> bool:
+    return "トゥ" in value
+
+
+def is_single_word(key: str) -> bool:
+    return " " not in key
+
+
+MERGE_RULES = [
+    MergeRule("katakana_map"),
+    MergeRule("data", keep_existing_if=contains_tu),
+    MergeRule("fix_s"),
+    MergeRule("manual_proper_noun", normalize_key=str.lower, include_key=is_single_word),
+    MergeRule("jawiki", normalize_key=str.lower, report_overrides=True),
+    MergeRule("manual_acronym", normalize_key=str.upper, include_key=str.isupper),
+]
+
+
+def load_sources(source_dir: Path) -> dict[str, dict[str, str]]:
+    """katakana_map.json 以外のマージ対象のソースを、MERGE_RULES の名前をキーとして読み込む"""
+    from data import KATAKANA_MAP as DATA_KATAKANA_MAP
+
+    return {
+        "data": DATA_KATAKANA_MAP,
+        "fix_s": load_json(source_dir / FIX_S_FILE),
+        "manual_proper_noun": load_json(source_dir / MANUAL_PROPER_NOUN_FILE),
+        "jawiki": load_json(source_dir / JAWIKI_FILE),
+        "manual_acronym": load_json(source_dir / MANUAL_ACRONYM_FILE),
+    }
+
+
+def load_overriding_keys(source_dir: Path) -> set[str]:
+    """katakana_map.json の値がマージ時に必ず他のソースの値で上書きされるキーの集合を返す"""
+    sources = load_sources(source_dir)
+    keys = set()
+    for rule in MERGE_RULES[1:]:
+        for key, value in sources[rule.name].items():
+            if rule.include_key is not None and not rule.include_key(key):
+                continue
+            # data.py の値に "トゥ" が含まれる場合は katakana_map.json の値が優先されるため、生成する意味がある
+            if rule.keep_existing_if is not None and rule.keep_existing_if(value):
+                continue
+            keys.add(key if rule.normalize_key is None else rule.normalize_key(key))
+    # katakana_map_manual_acronym.json のキーは大文字のまま追加されるため、小文字の単語とは一致しない
+    return keys
@@ -0,0 +1,240 @@
+"""
+マージ済みのカタカナ辞書を、配列ベースの静的なトライ木に変換して保持するためのモジュール
+
+zoom / zoomed / zoomer / zooming のように、辞書のキーの多くは接頭辞を共有している。
+このモジュールではキーを共通の接頭辞ごとにまとめたトライ木に格納し、各ノードから値 ID を引けるようにする。
+値は重複を除いた上で、ある値が別の値の末尾と一致する場合はその末尾部分を共有する (tail merging) 形で
+1 つの文字列 (値ヒープ) に連結して格納する。
+
+トライ木のノードは幅優先順に番号付けされており、i 番目の辺は必ず i + 1 番目のノードに繋がるため、
+辺の遷移先を保持する配列は不要となる。辺のラベルは 1 つの文字列に連結されており、各ノードの辺は文字順に並んでいるため、
+子ノードの検索はそのノードの範囲に対する bisect での二分探索で行う。
+全てのデータは array と文字列に格納されるため、ノードやキーごとの Python オブジェクトは作られず、
+dict と比べてメモリ使用量を大幅に削減できる。
+
+ファイルフォーマット (全てリトルエンディアン):
+- ヘッダー: マジックナンバー b"KMTR" (4 バイト) / バージョン (uint32) / ノード数 (uint32) / 値の数 (uint32) /
+  辺のラベルのバイト数 (uint32) / 値ヒープのバイト数 (uint32)
+- 各ノードの最初の辺の番号 (uint32 x (ノード数 + 1))
+- 各ノードの値 ID (int32 x ノード数、値を持たないノードは -1)
+- 各値の値ヒープ上の開始位置と終了位置 (文字単位、uint32 x 値の数 x 2)
+- 辺のラベルを連結した文字列 (UTF-8)
+- 値ヒープ (UTF-8)
+
+$ python katakana_map_trie.py [katakana_map_merged.json] [katakana_map_merged.kmtr]
+"""
+
+import json
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterator
+from pathlib import Path
+
+
+MAGIC = b"KMTR"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIII")
+
+
+def build_value_pool(values: list[str]) -> tuple[dict[str, int], array, array, str]:
+    """
+    重複を除いた値を、末尾が一致する部分を共有しながら 1 つの文字列 (値ヒープ) に連結する
+
+    値から値 ID への対応表、各値の値ヒープ上の開始位置と終了位置の配列、値ヒープを返す。
+    """
+    unique_values = sorted(set(values))
+    value_ids = {value: value_id for value_id, value in enumerate(unique_values)}
+    starts = array("I", [0]) * len(unique_values)
+    ends = array("I", [0]) * len(unique_values)
+    heap: list[str] = []
+    heap_size = 0
+
+    # 逆順の文字列でソートすると、ある値を末尾に含む値は必ずその直後に並ぶ
+    # 後ろから順にヒープに格納し、直後の値の末尾と一致する場合はその部分を指すようにする
+    next_value = ""
+    next_end = 0
+    for value in sorted(unique_values, key=lambda value: value[::-1], reverse=True):
+        if next_value.endswith(value):
+            end = next_end
+        else:
+            heap.append(value)
+            heap_size += len(value)
+            end = heap_size
+            next_value = value
+            next_end = end
+        starts[value_ids[value]] = end - len(value)
+        ends[value_ids[value]] = end
+
+    return value_ids, starts, ends, "".join(heap)
+
+
+class KatakanaTrie:
+    """配列ベースの静的なトライ木でカタカナ辞書を保持し、dict と同様のインターフェイスで検索するクラス"""
+
+    def __init__(
+        self,
+        first_edges: array,
+        labels: str,
+        node_values: array,
+        value_starts: array,
+        value_ends: array,
+        value_heap: str,
+    ) -> None:
+        self.first_edges = first_edges
+        self.labels = labels
+        self.node_values = node_values
+        self.value_starts = value_starts
+        self.value_ends = value_ends
+        self.value_heap = value_heap
+        self.size = sum(1 for value_id in node_values if value_id >= 0)
+
+    @classmethod
+    def build(cls, katakana_map: dict[str, str]) -> "KatakanaTrie":
+        """カタカナ辞書からトライ木を構築する"""
+        value_ids, value_starts, value_ends, value_heap = build_value_pool(list(katakana_map.values()))
+
+        # 一旦 dict の入れ子でトライ木を構築し、その後幅優先順に配列へ詰め込む
+        # 子ノードの dict のキー "" には、そのノードで終わるキーの値 ID を格納する
+        root: dict = {}
+        for key, value in katakana_map.items():
+            node = root
+            for char in key:
+                node = node.setdefault(char, {})
+            node[""] = value_ids[value]
+
+        first_edges = array("I")
+        labels: list[str] = []
+        node_values = array("i")
+        queue = [root]
+        for node in queue:
+            first_edges.append(len(labels))
+            node_values.append(node.get("", -1))
+            for char in sorted(char for char in node if char != ""):
+                labels.append(char)
+                queue.append(node[char])
+        first_edges.append(len(labels))
+
+        return cls(first_edges, "".join(labels), node_values, value_starts, value_ends, value_heap)
+
+    def save(self, path: Path) -> None:
+        """トライ木をファイルに保存する"""
+        encoded_labels = self.labels.encode("utf-8")
+        encoded_heap = self.value_heap.encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(
+                HEADER.pack(
+                    MAGIC,
+                    VERSION,
+                    len(self.node_values),
+                    len(self.value_starts),
+                    len(encoded_labels),
+                    len(encoded_heap),
+                )
+            )
+            for data in [self.first_edges, self.node_values, self.value_starts, self.value_ends]:
+                if sys.byteorder != "little":
+                    data = array(data.typecode, data)
+                    data.byteswap()
+                data.tofile(f)
+            f.write(encoded_labels)
+            f.write(encoded_heap)
+
+    @classmethod
+    def load(cls, path: Path) -> "KatakanaTrie":
+        """save() で保存したトライ木をファイルから読み込む"""
+        with open(path, "rb") as f:
+            magic, version, node_count, value_count, labels_size, heap_size = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a katakana map trie (version {VERSION})")
+            arrays = []
+            for typecode, length in [("I", node_count + 1), ("i", node_count), ("I", value_count), ("I", value_count)]:
+                data = array(typecode)
+                data.fromfile(f, length)
+                if sys.byteorder != "little":
+                    data.byteswap()
+                arrays.append(data)
+            first_edges, node_values, value_starts, value_ends = arrays
+            labels = f.read(labels_size).decode("utf-8")
+            value_heap = f.read(heap_size).decode("utf-8")
+        return cls(first_edges, labels, node_values, value_starts, value_ends, value_heap)
+
+    def find_node(self, key: str, start: int = 0) -> int:
+        """key[start:] に対応するノード番号を返す。存在しない場合は -1 を返す"""
+        labels = self.labels
+        first_edges = self.first_edges
+        node = 0
+        for index in range(start, len(key)):
+            char = key[index]
+            end = first_edges[node + 1]
+            edge = bisect_left(labels, char, first_edges[node], end)
+            if edge == end or labels[edge] != char:
+                return -1
+            node = edge + 1
+        return node
+
+    def value_id(self, key: str) -> int:
+        """キーに対応する値 ID を返す。キーが存在しない場合は -1 を返す"""
+        node = self.find_node(key)
+        if node < 0:
+            return -1
+        return self.node_values[node]
+
+    def value_of(self, value_id: int) -> str:
+        """値 ID に対応する値を返す"""
+        return self.value_heap[self.value_starts[value_id] : self.value_ends[value_id]]
+
+    def iter_prefixes(self, text: str, start: int = 0) -> Iterator[tuple[int, int]]:
+        """text[start:] の接頭辞のうち辞書のキーであるものについて、(終了位置, 値 ID) を短い順に返す"""
+        labels = self.labels
+        first_edges = self.first_edges
+        node_values = self.node_values
+        node = 0
+        for index in range(start, len(text)):
+            char = text[index]
+            end = first_edges[node + 1]
+            edge = bisect_left(labels, char, first_edges[node], end)
+            if edge == end or labels[edge] != char:
+                return
+            node = edge + 1
+            if node_values[node] >= 0:
+                yield index + 1, node_values[node]
+
+    def get(self, key: str, default: str | None = None) -> str | None:
+        value_id = self.value_id(key)
+        if value_id < 0:
+            return default
+        return self.value_of(value_id)
+
+    def __getitem__(self, key: str) -> str:
+        value_id = self.value_id(key)
+        if value_id < 0:
+            raise KeyError(key)
+        return self.value_of(value_id)
+
+    def __contains__(self, key: str) -> bool:
+        return self.value_id(key) >= 0
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def main() -> None:
+    current_dir = Path(__file__).parent
+    input_file = Path(sys.argv[1]) if len(sys.argv) > 1 else current_dir / "katakana_map_merged.json"
+    output_file = Path(sys.argv[2]) if len(sys.argv) > 2 else input_file.with_suffix(".kmtr")
+
+    with open(input_file, "r", encoding="utf-8") as f:
+        katakana_map = json.load(f)
+
+    trie = KatakanaTrie.build(katakana_map)
+    trie.save(output_file)
+    print(
+        f"Built a trie of {len(trie)} entries ({len(trie.node_values)} nodes, "
+        f"{len(trie.value_starts)} unique values, {len(trie.value_heap)} characters of value heap) to {output_file}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+カタカナの読みとして有効な文字列かどうかを判定するモジュール
+
+読みは NFKC 正規化し、結合文字の濁点・半濁点を削除した後の全ての文字が以下のいずれかであれば有効とする。
+
+- Unicode の文字名が KATAKANA または HALFWIDTH KATAKANA で始まり、一般カテゴリーが Lo / Lm / Sk / Mn / Pd の文字
+- 伸ばす棒 (ー) と中点 (・)
+
+文字ごとに unicodedata.name() を呼ぶ代わりに、該当する文字の集合をインポート時に 1 度だけ作成しておき、
+文字列全体がその部分集合かどうかを frozenset.issuperset() で判定する。
+さらに、正規化しても結果が変わらない文字だけからなる文字列 (katakana_map.json のほぼ全ての値) は、正規化自体を省く。
+"""
+
+import unicodedata
+
+
+# 読みとして有効な文字が含まれる Unicode のブロック
+KATAKANA_BLOCKS = [
+    (0x3000, 0x3100),  # CJK の記号及び句読点、ひらがな、カタカナ
+    (0x31F0, 0x3200),  # カタカナ拡張
+    (0xFF00, 0xFFF0),  # 半角・全角形
+    (0x1AFF0, 0x1B170),  # かな拡張 B、かな補助、かな拡張 A、小書きかな拡張
+]
+
+# 正規化時に削除する結合文字の濁点・半濁点
+COMBINING_SOUND_MARKS = "\u3099\u309A"
+
+
+def normalize_katakana(text):
+    text = unicodedata.normalize("NFKC", text)  # 正規化
+    text = text.replace("\u3099", "")  # 結合文字の濁点を削除、る゙ → る
+    text = text.replace("\u309A", "")  # 結合文字の半濁点を削除、な゚ → な
+    return text
+
+
+def is_katakana_char(char: str) -> bool:
+    """正規化済みの 1 文字が読みとして有効かどうかを、unicodedata で判定する"""
+    return (
+        (
+            unicodedata.category(char) in ["Lo", "Lm", "Sk", "Mn", "Pd"]
+            and unicodedata.name(char, "").startswith(("KATAKANA", "HALFWIDTH KATAKANA"))
+        )
+        or char == "ー"  # 伸ばす棒はカタカナ以外でも OK
+        or char == "・"  # 中点はカタカナ以外でも OK
+    )
+
+
+def build_katakana_chars() -> frozenset[str]:
+    """正規化後の文字列に含まれてよい文字 (削除される結合文字の濁点・半濁点を含む) の集合を作成する"""
+    chars = {chr(cp) for start, end in KATAKANA_BLOCKS for cp in range(start, end) if is_katakana_char(chr(cp))}
+    return frozenset(chars | {"ー", "・"} | set(COMBINING_SOUND_MARKS))
+
+
+KATAKANA_CHARS = build_katakana_chars()
+
+# KATAKANA_CHARS のうち、単独でも結合文字の濁点・半濁点が続いても、NFKC 正規化の結果が KATAKANA_CHARS に収まる文字
+# (゛ や ゜ は正規化すると半角スペースと結合文字になるため含まない)
+# これらの文字だけからなる文字列は、正規化しても判定結果が変わらない
+STABLE_KATAKANA_CHARS = frozenset(
+    char
+    for char in KATAKANA_CHARS
+    if all(
+        KATAKANA_CHARS.issuperset(unicodedata.normalize("NFKC", char + mark)) for mark in ("", *COMBINING_SOUND_MARKS)
+    )
+)
+
+
+def is_katakana(text: str) -> bool:
+    """text を正規化した結果が読みとして有効なカタカナの文字列かどうかを判定する"""
+    if STABLE_KATAKANA_CHARS.issuperset(text):
+        return True
+    return KATAKANA_CHARS.issuperset(unicodedata.normalize("NFKC", text))